@@ -1,19 +1,27 @@
-from flask import Flask, request, jsonify
-from pymongo import MongoClient
+from flask import Flask, Blueprint, Response, request, jsonify, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from bson import ObjectId
 from flask_cors import CORS
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from generator_code import RouteOptimizer
-from utils import query_database, get_database_outputs
-from supabase import create_client
-from PIL import Image
-import imagehash
-import base64
+from utils import (query_database, get_database_outputs, route_parameters, save_route_results, ensure_indexes,
+                   find_page, stringify_ids, parameter_fingerprint)
+from hint_cache import HintTreeStore
+from hints import (generate_hint_tree, generate_hint_trees, next_hint, final_hint, encode_tree_token, decode_tree_token,
+                   HINT_BATCH_SIZE, MAX_HINT_STEPS)
+from place_cache import PlaceCache, SQLitePlaceStore, MongoPlaceStore
+from naming import name_routes, add_photos, MysteryNameStore
+from llm import GeminiManager
+from jobs import JobQueue
+from proximity import (RouteIndex, RouteIndexCache, arrival_check, route_checkpoints, tolerance_to_meters,
+                       ARRIVAL_RADIUS_M)
+from image_hashing import ImageTooLarge, InvalidImage, decode_base64_image, read_upload, MAX_IMAGE_BYTES
+from image_pool import ImagePool, ImagePoolBusy, ImageTaskTimeout
+from responses import FastJSONProvider, ResponseCompressor, dumps, json_response
+from lazy import LazyClient
 import os
-import json
-import re
-from io import BytesIO
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Load environment variables
 load_dotenv()
@@ -21,161 +29,714 @@ load_dotenv()
 # Environment configuration
 api = os.getenv("API_KEY")
 gen_key = os.getenv("GEN_API")
-class_url = os.getenv("CLASS_URL")
-class_key = os.getenv("CLASS_KEY")
-search_id = os.getenv("SEARCH_ID")
 SUPABASE_URL = os.getenv("SUPABASE_URL", "").strip()
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "").strip()
 MONGO_URL = os.getenv("MONGO_URL")
+HINT_CACHE_TTL = int(os.getenv("HINT_CACHE_TTL", 7 * 24 * 3600))
+HINT_CACHE_SIZE = int(os.getenv("HINT_CACHE_SIZE", 1024))
+# signs the hint tree tokens handed to clients, must be the same on every worker
+HINT_TOKEN_SECRET = os.getenv("HINT_TOKEN_SECRET", "").encode() or secrets.token_bytes(32)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", 60))
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", 8))
+ROUTE_CACHE_MAX_AGE = int(os.getenv("ROUTE_CACHE_MAX_AGE", 24 * 3600))
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+PLACES_CONCURRENCY = int(os.getenv("PLACES_CONCURRENCY", 8))
+PLACE_CACHE_BACKEND = os.getenv("PLACE_CACHE_BACKEND", "sqlite")  # sqlite, mongo or none
+PLACE_CACHE_PATH = os.getenv("PLACE_CACHE_PATH", "place_cache.sqlite3")
+PLACE_SEARCH_TTL = int(os.getenv("PLACE_SEARCH_TTL", 24 * 3600))
+PLACE_DETAILS_TTL = int(os.getenv("PLACE_DETAILS_TTL", 7 * 24 * 3600))
+GEOCODE_TTL = int(os.getenv("GEOCODE_TTL", 90 * 24 * 3600))
+ROUTE_MATRIX_BUDGET = float(os.getenv("ROUTE_MATRIX_BUDGET", 8))
+ROUTE_SEED = int(os.getenv("ROUTE_SEED", 0))
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "route_jobs.sqlite3")
+# every web worker has its own job and image pools, together they should fill the cpus once
+WEB_WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+CPUS_PER_WORKER = max(1, (os.cpu_count() or 1) // WEB_WORKERS)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", CPUS_PER_WORKER))
+MAX_JOB_WAIT = 30
+CHECKPOINTS_TABLE = "checkpoints"
+MATCH_THRESHOLD = 45
+# identifying a photo across every checkpoint needs a much tighter radius than verifying against one
+IDENTIFY_RADIUS = int(os.getenv("IDENTIFY_RADIUS", 10))
+IDENTIFY_TOP_K = 5
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", CPUS_PER_WORKER))
+IMAGE_QUEUE_SIZE = int(os.getenv("IMAGE_QUEUE_SIZE", IMAGE_WORKERS * 4))
+IMAGE_TASK_TIMEOUT = float(os.getenv("IMAGE_TASK_TIMEOUT", 10))
+IMAGE_RETRY_AFTER = 2
+MAX_BATCH_IMAGES = 100
+# base64 inflates an upload by a third, leave room for that plus the rest of the json
+MAX_REQUEST_BYTES = MAX_IMAGE_BYTES * 4 // 3 + 1024 * 1024
+# /add_sample_images only, every other route keeps the single image limit above
+MAX_BATCH_REQUEST_BYTES = int(os.getenv("MAX_BATCH_REQUEST_BYTES", 256 * 1024 * 1024))
+# connections per worker process, workers x this has to stay under the cluster's connection limit
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 10))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", 60000))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", 5000))
+
+# list views only need the cluster cards, not every stop
+OUTPUT_SUMMARY_PROJECTION = {"routes.Route": 0}
+
+bp = Blueprint("voyagr", __name__)
+compress_response = ResponseCompressor()
+# stops of stored routes indexed once, location checks never leave the process
+route_indexes = RouteIndexCache()
+# decoding and hashing photos is cpu bound, keep it off the web threads (the pool starts on first use)
+image_pool = ImagePool(max_workers=IMAGE_WORKERS, max_pending=IMAGE_QUEUE_SIZE, timeout=IMAGE_TASK_TIMEOUT)
+
+# clients, sockets and thread pools are built per worker process, after the fork and on first use
+_services_pid = None
+_services_lock = threading.Lock()
+
+
+def init_services():
+    global supabase, genai_client, llm, mongo_client, db, inputs_collection, outputs_collection
+    global hint_store, place_store, place_cache, places_client, geocoder, travel_matrix
+    global naming_executor, mystery_names, hint_executor, phash_index, route_jobs
+
+    # supabase, genai, pymongo and numpy are imported by the first call that needs them,
+    # a worker that only checks locations never loads them (python import_report.py shows the cost)
+    supabase = LazyClient(make_supabase_client)
+    genai_client = LazyClient(make_genai_client)
+    # one quota and one cache for hints and naming alike
+    llm = GeminiManager(genai_client, requests_per_minute=GEMINI_RPM, max_concurrency=GEMINI_CONCURRENCY)
+
+    mongo_client = LazyClient(make_mongo_client)
+    db = mongo_client['routeOptimizer']
+    inputs_collection = db['inputs']
+    outputs_collection = db['outputs']
+
+    # hint trees are generated once per place and reused by every player at that checkpoint
+    hint_store = HintTreeStore(db['hint_trees'], max_entries=HINT_CACHE_SIZE, ttl=HINT_CACHE_TTL)
+
+    # nearby results barely change within a day, so overlapping searches are answered from cached geohash cells
+    place_store = None
+    if PLACE_CACHE_BACKEND == "sqlite":
+        place_store = SQLitePlaceStore(PLACE_CACHE_PATH)
+    elif PLACE_CACHE_BACKEND == "mongo":
+        place_store = MongoPlaceStore(db['place_cache'])
+    place_cache = PlaceCache(place_store, PLACE_SEARCH_TTL, PLACE_DETAILS_TTL) if place_store else None
+    places_client = LazyClient(make_places_client)
+    # most trips start from the same few hundred hotel and campus addresses
+    geocoder = LazyClient(make_geocoder)
+    travel_matrix = LazyClient(make_travel_matrix)
+    naming_executor = ThreadPoolExecutor(max_workers=5, thread_name_prefix="naming")
+    # a venue keeps its mystery name across requests
+    mystery_names = MysteryNameStore(db['mystery_names'])
+    hint_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hints")
+
+    # reference photo hashes are held in memory, verification never waits on supabase
+    phash_index = LazyClient(make_phash_index)
+
+    # the pipeline runs on its own worker pool, web threads only enqueue and poll
+    route_jobs = JobQueue(JOB_STORE_PATH, run_route_job, max_workers=JOB_WORKERS)
+    route_jobs.resume()
+
+
+def make_supabase_client():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
+def make_genai_client():
+    from google import genai
+    return genai.Client(api_key=gen_key)
+
+
+def make_mongo_client():
+    from pymongo import MongoClient
+    # connect=False so nothing waits on a handshake until the first query
+    client = MongoClient(MONGO_URL, connect=False, maxPoolSize=MONGO_MAX_POOL_SIZE,
+                         minPoolSize=MONGO_MIN_POOL_SIZE, maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+                         serverSelectionTimeoutMS=MONGO_TIMEOUT_MS, connectTimeoutMS=MONGO_TIMEOUT_MS)
+    # index builds talk to mongo, keep them off the request that first needed it
+    threading.Thread(target=ensure_all_indexes, name="ensure-indexes", daemon=True).start()
+    return client
+
+
+def make_places_client():
+    from places_client import PlacesClient
+    return PlacesClient(api_key=api, max_concurrency=PLACES_CONCURRENCY, cache=place_cache)
+
+
+def make_geocoder():
+    from geocoding import Geocoder
+    return Geocoder(api_key=api, store=place_store, ttl=GEOCODE_TTL)
+
+
+def make_travel_matrix():
+    from travel_matrix import TravelMatrix
+    return TravelMatrix(api_key=api, store=place_store, budget=ROUTE_MATRIX_BUDGET)
+
 
-# Initialize services
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-genai_client = genai.Client(api_key=gen_key)
-optimizer = RouteOptimizer(api_key=api, gen_api=gen_key, class_url=class_url, class_key=class_key, search_id=search_id)
+def make_phash_index():
+    from phash_index import PhashIndex
+    return PhashIndex(supabase, CHECKPOINTS_TABLE)
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)
 
-# MongoDB setup
-client = MongoClient(MONGO_URL)
-db = client['routeOptimizer']
-inputs_collection = db['inputs']
-outputs_collection = db['outputs']
+def ensure_all_indexes():
+    ensure_indexes(inputs_collection, outputs_collection)
+    hint_store.ensure_indexes()
+    if isinstance(place_store, MongoPlaceStore):
+        place_store.ensure_indexes(max(PLACE_SEARCH_TTL, PLACE_DETAILS_TTL, GEOCODE_TTL))
 
 
-@app.route('/generate_location_hint', methods=['POST'])
-def generate_location_hint():
-    try:
-        data = request.json
-        location_name = data.get('location_name')
-        previous_hint_id = data.get('previous_hint_id')
-        user_response = data.get('user_response')
-        reject_count = data.get('reject_count', 0)
-        accept_count = data.get('accept_count', 0)
+@bp.before_app_request
+def ensure_services():
+    # a forked worker gets its own clients instead of sharing the parent's sockets
+    global _services_pid
+    if _services_pid == os.getpid():
+        return
+    with _services_lock:
+        if _services_pid != os.getpid():
+            init_services()
+            _services_pid = os.getpid()
 
-        if previous_hint_id == "final" or reject_count >= 3 or accept_count >= 3:
-            return jsonify({"hint": {"id": "final", "text": f"The answer is {location_name}.", "type": "factual"}, "is_final": True})
 
-        hint_tree = generate_hint_tree_from_gemini(location_name)
+@bp.after_app_request
+def compress(response):
+    # gzip/br for large json bodies, and a 304 when the client's If-None-Match still matches
+    return compress_response(response, request)
 
-        if previous_hint_id is None:
-            hint = hint_tree["tree"]["1"]
-            return jsonify({"hint": {"id": "1", **hint}, "is_final": False})
 
-        current = hint_tree["tree"].get(previous_hint_id)
-        next_hint_id = current.get("on_understood" if user_response == "understood" else "on_confused")
+@bp.route('/ready', methods=['GET'])
+def ready():
+    # readiness for the load balancer: this worker's clients exist and mongo answers
+    checks = {"services": _services_pid == os.getpid()}
+    try:
+        mongo_client.admin.command("ping")
+        checks["mongo"] = True
+    except Exception as e:
+        print(f"[WARN] Readiness check: mongo ping failed: {str(e)}")
+        checks["mongo"] = False
+    is_ready = all(checks.values())
+    return jsonify({"ready": is_ready, "checks": checks, "pid": os.getpid()}), 200 if is_ready else 503
 
-        if next_hint_id is None:
-            return jsonify({"hint": {"id": "final", "text": f"The answer is {location_name}.", "type": "factual"}, "is_final": True})
 
-        next_hint = hint_tree["tree"][next_hint_id]
-        return jsonify({"hint": {"id": next_hint_id, **next_hint}, "is_final": False})
+@bp.route('/generate_location_hint', methods=['POST'])
+def generate_location_hint():
+    try:
+        data = request.json
+        location_name = data.get('location_name')
+        previous_hint_id = data.get('previous_hint_id')
+        step = (previous_hint_id, data.get('user_response'), data.get('reject_count', 0), data.get('accept_count', 0))
+
+        # a tree token from the first response makes every later step a pure function, no store lookup
+        hint_tree = None
+        if data.get('tree_token'):
+            try:
+                hint_tree = decode_tree_token(data['tree_token'], HINT_TOKEN_SECRET)
+            except ValueError as e:
+                print(f"[WARN] generate_location_hint: {e}, falling back to the hint store")
+        if hint_tree is None:
+            if previous_hint_id == "final" or step[2] >= MAX_HINT_STEPS or step[3] >= MAX_HINT_STEPS:
+                return jsonify(final_hint(location_name))
+            hint_tree = hint_store.get_or_create(location_name, lambda name: generate_hint_tree(llm, name))
+
+        response = next_hint(hint_tree, location_name, *step)
+        # clients that ask for the tree walk it on-device and only come back if they lose it
+        if previous_hint_id is None and data.get('include_tree'):
+            response["tree"] = hint_tree["tree"]
+            response["tree_token"] = encode_tree_token(hint_tree, HINT_TOKEN_SECRET)
+        return jsonify(response)
 
     except Exception as e:
         return jsonify({"error": str(e), "message": "Error processing hint generation request"}), 500
 
 
-def generate_hint_tree_from_gemini(location_name):
-    prompt = f"""Generate hints for a location quiz about {location_name}. Return only JSON:
-    {{"place_id": "{location_name.lower().replace(' ', '_')}", "tree": {{"1": {{"text": "...", "type": "symbolic", "on_understood": "2A", "on_confused": "2B"}}, ...}}}}"""
-    try:
-        response = genai_client.models.generate_content(
-            model='gemini-2.0-flash-001',
-            contents=prompt,
-            config=types.GenerateContentConfig(temperature=0.2, max_output_tokens=1000)
-        )
-        text = re.search(r'({.*})', response.text, re.DOTALL).group(1)
-        return json.loads(text)
-    except:
-        return generate_fallback_hint_tree(location_name)
+@bp.route('/llm_metrics', methods=['GET'])
+def llm_metrics():
+    return jsonify(llm.metrics())
+
+
+def list_collection(collection, key, summary_projection=None):
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    after = request.args.get("after")
+    if after and not ObjectId.is_valid(after):
+        return jsonify({"error": "Invalid 'after' id"}), 400
+    projection = summary_projection if request.args.get("view") == "summary" else None
+
+    if request.args.get("format") == "ndjson":
+        # write documents as the cursor yields them, limit=0 streams the whole collection
+        cursor = find_page(collection, after, max(limit, 0), projection)
 
+        def generate():
+            for doc in cursor:
+                yield dumps(stringify_ids(doc)) + b"\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
-def generate_fallback_hint_tree(location_name):
-    return {"place_id": location_name.lower().replace(' ', '_'), "tree": {"1": {"text": "Popular destination", "type": "symbolic", "on_understood": "2A", "on_confused": "2B"}}}
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    docs = [stringify_ids(doc) for doc in find_page(collection, after, limit, projection)]
+    next_after = docs[-1]["_id"] if len(docs) == limit else None
+    return json_response({key: docs, "next_after": next_after}, etag=True)
 
 
-@app.route('/get_inputs', methods=['GET'])
+@bp.route('/get_inputs', methods=['GET'])
 def get_inputs():
     try:
-        inputs = list(inputs_collection.find())
-        for doc in inputs:
-            doc['_id'] = str(doc['_id'])
-        return jsonify({"inputs": inputs})
+        return list_collection(inputs_collection, "inputs")
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/get_outputs', methods=['GET'])
+@bp.route('/get_outputs', methods=['GET'])
 def get_outputs():
     try:
-        outputs = list(outputs_collection.find())
-        for doc in outputs:
-            doc['_id'] = str(doc['_id'])
-        return jsonify({"outputs": outputs})
+        return list_collection(outputs_collection, "outputs", OUTPUT_SUMMARY_PROJECTION)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/get_data_from_parameters', methods=['POST'])
+@bp.route('/get_data_from_parameters', methods=['POST'])
 def get_data_from_parameters():
     parameters = request.json
     input_id = query_database(inputs_collection, parameters)
     if input_id:
         outputs = get_database_outputs(outputs_collection, input_id)
-        return jsonify({"routes": outputs})
-    return jsonify({"routes": []})
+        return json_response({"routes": outputs}, etag=True)
+    return json_response({"routes": []}, etag=True)
+
+
+def pregenerate_hints(routes):
+    # hint trees for every stop are generated in the background as soon as the routes exist,
+    # so the quiz at each checkpoint is a lookup instead of a gemini call
+    names = list(dict.fromkeys(leg["Name"] for cluster in routes for leg in cluster["Route"] if leg.get("Name")))
+    for i in range(0, len(names), HINT_BATCH_SIZE):
+        hint_executor.submit(hint_store.get_or_create_many, names[i:i + HINT_BATCH_SIZE],
+                             lambda batch: generate_hint_trees(llm, batch))
+
+
+def starting_point(use_current_location, address):
+    # the device's own position can't be shared between requests, typed addresses can
+    if use_current_location:
+        return geocoder.locate()
+    return geocoder.geocode(address)
+
+
+def route_events(params):
+    # every stage of the route pipeline as an event, /optimize_route only cares about the last one
+    # current-location trips depend on where the device is, so they are never shared
+    from route_engine import plan_routes
+
+    cacheable = not params["use_current_location"]
+    if cacheable:
+        input_id = query_database(inputs_collection, params, max_age=ROUTE_CACHE_MAX_AGE)
+        outputs = get_database_outputs(outputs_collection, input_id) if input_id else []
+        if outputs:
+            # trees expire sooner than cached routes, refill any that are gone
+            pregenerate_hints(outputs[0]["routes"])
+            yield {"event": "done", "routes": outputs[0]["routes"], "cache": "hit", "input_id": str(input_id)}
+            return
+
+    lati, long = starting_point(params["use_current_location"], params["address"])
+    if lati is None:
+        yield {"event": "error", "error": "Invalid address", "status": 400}
+        return
+    yield {"event": "start", "lat": lati, "lng": long}
+
+    places = places_client.nearby_places_multi_keyword(
+        base_keywords=params["keyword"], maxresult=20, lat=lati, lon=long, radius=params["radius"])
+    final_places = places_client.sorted_place_details(places, accessible=params["accessibility"])
+    yield {"event": "places", "places": [
+        {"name": p.get("name"), "lat": p["geometry"]["location"]["lat"], "lng": p["geometry"]["location"]["lng"]}
+        for p in final_places]}
+
+    planned_routes = plan_routes(
+        lat=lati, lng=long, places=final_places, time_limit=params["time_limit"],
+        max_groups=5, visit_duration_per_location=params["time_per_location"],
+        user_modes=params["modes"], travel_matrix=travel_matrix, seed=ROUTE_SEED)
+    pregenerate_hints([cluster for cluster, _ in planned_routes])
+    for cluster, _ in planned_routes:
+        yield {"event": "route", "route": cluster}
+
+    # names, descriptions and images trail behind as patches keyed by cluster id,
+    # the whole route set is named by one gemini call while the photos resolve
+    naming = naming_executor.submit(name_routes, llm, planned_routes, mystery_names)
+    photos = [naming_executor.submit(add_photos, places_client, cluster, stops) for cluster, stops in planned_routes]
+    naming.result()
+    for future in as_completed(photos):
+        cluster = future.result()
+        yield {"event": "patch", "Cluster ID": cluster["Cluster ID"],
+               "Cluster Name": cluster["Cluster Name"], "Cluster Description": cluster["Cluster Description"],
+               "Route": [{"Mystery Name": leg["Mystery Name"], "Image URL": leg["Image URL"]} for leg in cluster["Route"]]}
+
+    routes = [cluster for cluster, _ in planned_routes]
+    input_id = None
+    if cacheable and routes:
+        input_id = save_route_results(inputs_collection, outputs_collection, params, routes)
+    # the input id lets players check in against the stored route instead of resending its stops
+    yield {"event": "done", "routes": routes, "cache": "miss", "input_id": str(input_id) if input_id else None}
+
+
+@bp.route('/optimize_route', methods=['POST'])
+def optimize_route():
+    try:
+        for event in route_events(route_parameters(request.json)):
+            if event["event"] == "error":
+                return jsonify({"error": event["error"]}), event["status"]
+            if event["event"] == "done":
+                return jsonify({"routes": event["routes"], "cache": event["cache"], "input_id": event["input_id"]})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 
-@app.route('/optimize_route', methods=['POST'])
-def optimize_route():
+@bp.route('/optimize_route_stream', methods=['POST'])
+def optimize_route_stream():
+    params = route_parameters(request.json)
+
+    def generate():
+        try:
+            for event in route_events(params):
+                yield dumps(event) + b"\n"
+        except Exception as e:
+            yield dumps({"event": "error", "error": str(e), "status": 500}) + b"\n"
+    # one json event per line, flushed as each pipeline stage finishes
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
+
+
+def run_route_job(params):
+    for event in route_events(params):
+        if event["event"] == "error":
+            raise ValueError(event["error"])
+        if event["event"] == "done":
+            return {"routes": event["routes"], "cache": event["cache"], "input_id": event["input_id"]}
+
+
+@bp.route('/optimize_route_async', methods=['POST'])
+def optimize_route_async():
     try:
-        data = request.json
-        address = data.get("address")
-        lati, long = optimizer.starting_point(data.get("use_current_location", False), address)
-        if lati is None:
-            return jsonify({"error": "Invalid address"}), 400
-        places = optimizer.nearby_places_multi_keyword(
-            base_keywords=data.get("keyword", []), maxresult=20, lat=lati, lon=long, radius=data.get("radius", 10))
-        final_places = optimizer.sorted_place_details(places, accessible=data.get("accessibility", False))
-        optimized_routes = optimizer.optimize_routes(
-            lat=lati, lng=long, places=final_places, time_limit=data.get("time_limit", 500),
-            max_groups=5, visit_duration_per_location=data.get("time_per_location", 0),
-            user_modes=data.get("modes", ["driving"]))
-        return jsonify({"routes": json.loads(optimized_routes)})
+        params = route_parameters(request.json)
+        fingerprint = None if params["use_current_location"] else parameter_fingerprint(params)
+        job_id = route_jobs.submit(params, fingerprint)
+        return jsonify({"job_id": job_id, "status_url": f"/route_job/{job_id}"}), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/check_user_location', methods=['POST'])
+@bp.route('/route_job/<job_id>', methods=['GET'])
+def route_job(job_id):
+    # ?wait=N long-polls up to N seconds for the job to finish
+    wait = min(request.args.get("wait", 0, type=float), MAX_JOB_WAIT)
+    job = route_jobs.wait(job_id, wait, raw=True) if wait > 0 else route_jobs.get(job_id, raw=True)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    if "result" not in job:
+        return jsonify(job)
+    # the stored result is already json, splice it in instead of parsing and dumping it again
+    result = job.pop("result").encode()
+    return json_response(raw=dumps(job)[:-1] + b',"result":' + result + b"}", etag=True)
+
+
+def load_route_checkpoints(input_id, cluster_id):
+    if not ObjectId.is_valid(input_id):
+        return None
+    doc = outputs_collection.find_one({"input_id": ObjectId(input_id)}, {"routes": 1})
+    for cluster in (doc or {}).get("routes", []):
+        if cluster.get("Cluster ID") == cluster_id:
+            return route_checkpoints(cluster)
+    return None
+
+
+@bp.route('/check_user_location', methods=['POST'])
 def check_user_location():
     try:
         data = request.json
-        is_at_location = optimizer.is_user_at_location(
-            data.get("target_lat"), data.get("target_lon"), data.get("tolerance", 0.01))
-        return jsonify({"is_at_location": is_at_location})
+        lat, lng = data.get("lat"), data.get("lng", data.get("lon"))
+        if lat is None or lng is None:
+            # older clients only send the target and leave locating the device to the server
+            lat, lng = geocoder.locate()
+            if lat is None:
+                return jsonify({"error": "Could not determine the current location"}), 502
+            check = arrival_check(lat, lng, float(data["target_lat"]), float(data["target_lon"]),
+                                  tolerance_to_meters(data.get("tolerance", 0.01)))
+            return jsonify({"is_at_location": check["is_at_location"]})
+
+        lat, lng = float(lat), float(lng)
+        accuracy = float(data["accuracy"]) if data.get("accuracy") is not None else None
+        if data.get("radius_m") is not None:
+            radius_m = float(data["radius_m"])
+        elif data.get("tolerance") is not None:
+            radius_m = tolerance_to_meters(data["tolerance"])
+        else:
+            radius_m = ARRIVAL_RADIUS_M
+
+        # a whole route in one call, either a stored one or stops sent by the client
+        if data.get("input_id") is not None or data.get("checkpoints"):
+            if data.get("checkpoints"):
+                index = RouteIndex([(float(c["lat"]), float(c["lng"]), c.get("name")) for c in data["checkpoints"]],
+                                   radius_m)
+            else:
+                cluster_id = int(data.get("cluster_id", 0))
+                index = route_indexes.get_or_build(
+                    (data["input_id"], cluster_id, radius_m),
+                    lambda: load_route_checkpoints(data["input_id"], cluster_id), radius_m)
+            if index is None:
+                return jsonify({"error": "Unknown route"}), 404
+            return jsonify(index.check(lat, lng, accuracy, int(data.get("next_index", 0))))
+
+        if data.get("target_lat") is None or data.get("target_lon") is None:
+            return jsonify({"error": "Target latitude and longitude are required"}), 400
+        return jsonify(arrival_check(lat, lng, float(data["target_lat"]), float(data["target_lon"]), radius_m, accuracy))
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({"error": f"Invalid location parameters: {str(e)}"}), 400
     except:
         return jsonify({"error": "Failed to verify location"}), 500
 
 
-@app.route('/add_sample_image', methods=['POST'])
+def request_image(field):
+    # (form fields, image bytes) from a multipart upload or from base64 in a json body
+    if request.files:
+        upload = request.files.get(field)
+        return request.form, read_upload(upload) if upload else None
+    data = request.get_json(silent=True) or {}
+    return data, decode_base64_image(data[field]) if data.get(field) else None
+
+
+# these turn into their own status codes instead of the endpoint's generic 500
+IMAGE_REQUEST_ERRORS = (ImageTooLarge, InvalidImage, RequestEntityTooLarge, ImagePoolBusy, ImageTaskTimeout)
+
+
+def image_hashes(image_bytes):
+    try:
+        return image_pool.hash(image_bytes)
+    except IMAGE_REQUEST_ERRORS:
+        raise
+    except Exception as e:
+        print(f"[ERROR] image_hashes: Error calculating pHash: {e}")
+        return None
+
+
+@bp.app_errorhandler(RequestEntityTooLarge)
+@bp.app_errorhandler(ImageTooLarge)
+def image_too_large(e):
+    message = str(e) if isinstance(e, ImageTooLarge) else "Upload is too large"
+    return jsonify({"error": message, "max_image_bytes": MAX_IMAGE_BYTES}), 413
+
+
+@bp.app_errorhandler(InvalidImage)
+def invalid_image(e):
+    return jsonify({"error": str(e)}), 400
+
+
+@bp.app_errorhandler(ImagePoolBusy)
+def image_pool_busy(e):
+    return jsonify({"error": str(e), "retry_after": IMAGE_RETRY_AFTER}), 503, {"Retry-After": str(IMAGE_RETRY_AFTER)}
+
+
+@bp.app_errorhandler(ImageTaskTimeout)
+def image_task_timeout(e):
+    return jsonify({"error": str(e)}), 504
+
+
+@bp.route('/verify_location_image_supabase', methods=['POST'])
+def verify_location_image_supabase():
+    from phash_index import HASH_BITS
+
+    try:
+        data, image_bytes = request_image('image')
+        location_name = data.get('location_name')
+        if not image_bytes or not location_name:
+            return jsonify({"error": "Missing required parameters: image and location_name"}), 400
+
+        hashes = image_hashes(image_bytes)
+        if not hashes:
+            return jsonify({"error": "Failed to process uploaded image.", "is_match": False, "confidence": 0.0}), 500
+        uploaded_hash = hashes["phash"]
+
+        found = phash_index.match(location_name, uploaded_hash)
+        if found is None:
+            return jsonify({"error": f"No sample images found for location: {location_name}",
+                            "is_match": False, "confidence": 0.0, "matching_info": []}), 404
+        distances, references = found
+
+        best = int(distances.argmin())
+        min_distance = int(distances[best])
+        is_match = min_distance <= MATCH_THRESHOLD
+        best_match_info = {
+            "name": f"Reference for {location_name}",
+            "score": max(0.0, (HASH_BITS - min_distance) / HASH_BITS),
+            "distance": min_distance,
+            "reference_hash": references[best]["image_hash"],
+            "image_url": references[best]["image_path"],
+        }
+
+        # flag photos that look even more like some other checkpoint
+        other_match = None
+        if min_distance > 0:
+            closest = phash_index.identify(uploaded_hash, min(IDENTIFY_RADIUS, min_distance - 1), top_k=1)
+            if closest and location_name.strip().lower() not in closest[0]["location_name"].lower():
+                other_match = checkpoint_candidate(closest[0])
+
+        return jsonify({
+            "is_match": is_match,
+            "confidence": best_match_info["score"],
+            "matching_info": [best_match_info],
+            "other_checkpoint_match": other_match,
+            "debug": {
+                "location_searched": location_name,
+                "uploaded_image_hash": uploaded_hash,
+                "uploaded_image_hashes": hashes,
+                "samples_found_count": len(references),
+                "min_distance_found": min_distance,
+                "match_threshold": MATCH_THRESHOLD,
+            }
+        })
+    except IMAGE_REQUEST_ERRORS:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e), "message": "Error processing image verification request"}), 500
+
+
+def checkpoint_candidate(reference):
+    from phash_index import HASH_BITS
+
+    return {
+        "location_name": reference["location_name"],
+        "distance": reference["distance"],
+        "confidence": max(0.0, (HASH_BITS - reference["distance"]) / HASH_BITS),
+        "reference_hash": reference["image_hash"],
+        "image_url": reference["image_path"],
+    }
+
+
+@bp.route('/identify_location_image', methods=['POST'])
+def identify_location_image():
+    # "which checkpoint is this?" without trusting a client-sent location name
+    try:
+        data, image_bytes = request_image('image')
+        if not image_bytes:
+            return jsonify({"error": "Missing required parameter: image"}), 400
+        radius = int(data.get('max_distance', IDENTIFY_RADIUS))
+        top_k = int(data.get('top_k', IDENTIFY_TOP_K))
+
+        hashes = image_hashes(image_bytes)
+        if not hashes:
+            return jsonify({"error": "Failed to process uploaded image."}), 500
+        uploaded_hash = hashes["phash"]
+
+        candidates = [checkpoint_candidate(c) for c in phash_index.identify(uploaded_hash, radius, top_k)]
+        return jsonify({
+            "candidates": candidates,
+            "is_match": bool(candidates),
+            "uploaded_image_hash": uploaded_hash,
+            "uploaded_image_hashes": hashes,
+            "max_distance": radius,
+        })
+    except IMAGE_REQUEST_ERRORS:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e), "message": "Error identifying location image"}), 500
+
+
+@bp.route('/add_sample_image', methods=['POST'])
 def add_sample_image():
-    data = request.json
+    data, image_bytes = request_image('image_data')
     location_name = data.get('location_name')
-    image_base64 = data.get('image_data')
     image_path_url = data.get('image_path')
-    if not location_name or not image_base64 or not image_path_url:
+    if not location_name or not image_bytes or not image_path_url:
         return jsonify({"error": "Missing parameters"}), 400
     try:
-        image_data = base64.b64decode(image_base64)
-        image = Image.open(BytesIO(image_data))
-        phash = str(imagehash.phash(image.convert('L')))
-        insert_data = {"location_name": location_name.strip(), "image_hash": phash, "image_path": image_path_url}
-        response = supabase.table("checkpoints").insert(insert_data).execute()
+        hashes = image_hashes(image_bytes)
+        if not hashes:
+            return jsonify({"error": "Failed to process sample image for hashing."}), 500
+        insert_data = {"location_name": location_name.strip(), "image_hash": hashes["phash"], "image_path": image_path_url}
+        response = supabase.table(CHECKPOINTS_TABLE).insert(insert_data).execute()
+        phash_index.add(response.data)
         return jsonify({"success": True, "data": response.data})
+    except IMAGE_REQUEST_ERRORS:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def batch_images():
+    # [(location_name, image_path, image bytes or error)] from a multipart form or a json list
+    items = []
+    if request.files:
+        uploads = request.files.getlist('image_data')
+        names = request.form.getlist('location_name')
+        paths = request.form.getlist('image_path')
+        # one location name can cover every file in the form
+        names = names * len(uploads) if len(names) == 1 else names
+        for i, upload in enumerate(uploads):
+            try:
+                image = read_upload(upload)
+            except ImageTooLarge as e:
+                image = e
+            items.append((names[i] if i < len(names) else None, paths[i] if i < len(paths) else None, image))
+        return items
+
+    for entry in (request.get_json(silent=True) or {}).get('images', []):
+        try:
+            image = decode_base64_image(entry['image_data']) if entry.get('image_data') else None
+        except ValueError as e:
+            image = e
+        items.append((entry.get('location_name'), entry.get('image_path'), image))
+    return items
+
+
+@bp.route('/add_sample_images', methods=['POST'])
+def add_sample_images():
+    # bulk version of /add_sample_image, near-duplicates of existing references are skipped
+    from reference_ingest import dedupe_references, insert_references, DUPLICATE_DISTANCE
+
+    # raised before the body is read, each image is still held to MAX_IMAGE_BYTES
+    request.max_content_length = MAX_BATCH_REQUEST_BYTES
+    try:
+        items = batch_images()
+        if not items:
+            return jsonify({"error": "Missing parameters: images"}), 400
+        if len(items) > MAX_BATCH_IMAGES:
+            return jsonify({"error": f"At most {MAX_BATCH_IMAGES} images per request"}), 400
+        data = request.form if request.files else request.get_json(silent=True) or {}
+        max_distance = int(data.get('max_distance', DUPLICATE_DISTANCE))
+
+        failed = []
+        pending = []
+        for index, (location_name, image_path, image) in enumerate(items):
+            if not location_name or not image_path or not image:
+                failed.append({"index": index, "error": "Missing parameters"})
+            elif isinstance(image, Exception):
+                failed.append({"index": index, "error": str(image)})
+            else:
+                pending.append((index, location_name, image_path, image))
+
+        rows = []
+        hashes = image_pool.hash_many([image for _, _, _, image in pending])
+        for (index, location_name, image_path, _), hashed in zip(pending, hashes):
+            if "error" in hashed:
+                failed.append({"index": index, "error": hashed["error"]})
+            else:
+                rows.append({"location_name": location_name.strip(), "image_hash": hashed["phash"], "image_path": image_path})
+
+        rows, duplicates = dedupe_references(rows, phash_index, max_distance)
+        inserted = insert_references(supabase, CHECKPOINTS_TABLE, rows)
+        phash_index.add(inserted)
+        return jsonify({
+            "success": True,
+            "inserted": len(inserted),
+            "data": inserted,
+            "duplicates": [{"location_name": r["location_name"], "image_path": r["image_path"]} for r in duplicates],
+            "failed": sorted(failed, key=lambda f: f["index"]),
+        })
+    except IMAGE_REQUEST_ERRORS:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def create_app():
+    # gunicorn -c gunicorn.conf.py "app:create_app()", the dev server below is for local use only
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+    # jsonify goes through orjson when it is installed
+    app.json = FastJSONProvider(app)
+    CORS(app)
+    app.register_blueprint(bp)
+    return app
+
+
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0')
+    create_app().run(debug=True, host='0.0.0.0')
@@ -0,0 +1,54 @@
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from utils import parameter_fingerprint, ensure_indexes
+
+BATCH_SIZE = 1000
+
+
+def stored_parameters(doc):
+    # older seed docs (see trailer.py) used keyword/rad/disabled/mode instead of the current names
+    return {
+        "address": doc.get("address"),
+        "keyword": doc.get("keywords", doc.get("keyword")),
+        "radius": doc.get("radius", doc.get("rad")),
+        "accessibility": doc.get("accessibility", doc.get("disabled")),
+        "modes": doc.get("modes", doc.get("mode")),
+        "use_current_location": doc.get("use_current_location"),
+        "time_per_location": doc.get("time_per_location"),
+        "time_limit": doc.get("time_limit"),
+    }
+
+
+def backfill(inputs_collection):
+    seen = set(inputs_collection.distinct("fingerprint"))
+    updates = []
+    updated = skipped = 0
+
+    # newest first, so when two old docs collapse onto one fingerprint the newest keeps it
+    for doc in inputs_collection.find({"fingerprint": {"$exists": False}}).sort("_id", -1):
+        fingerprint = parameter_fingerprint(stored_parameters(doc))
+        if fingerprint in seen:
+            skipped += 1
+            continue
+        seen.add(fingerprint)
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"fingerprint": fingerprint}}))
+        if len(updates) >= BATCH_SIZE:
+            updated += inputs_collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+            print(f"Backfilled {updated} inputs so far")
+
+    if updates:
+        updated += inputs_collection.bulk_write(updates, ordered=False).modified_count
+
+    print(f"Backfilled {updated} inputs, skipped {skipped} duplicates")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGO_URL"))
+    db = client['routeOptimizer']
+    backfill(db['inputs'])
+    ensure_indexes(db['inputs'], db['outputs'])
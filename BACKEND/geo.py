@@ -0,0 +1,113 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+# geohash cells are addressed at bit precision rather than whole base32 characters,
+# each extra bit halves one side so a cell size can be picked to match a search radius
+MAX_GEOHASH_BITS = 50
+COMPASS_POINTS = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def initial_bearing(lat1, lon1, lat2, lon2):
+    # compass bearing in degrees (0 = north, 90 = east) to head from the first point to the second
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlam = math.radians(lon2 - lon1)
+    x = math.sin(dlam) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlam)
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+
+def compass_point(bearing):
+    return COMPASS_POINTS[int((bearing + 22.5) // 45) % 8]
+
+
+def geohash_bits(lat, lon, bits):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    value = 0
+    for i in range(bits):
+        rng, coord = (lon_range, lon) if i % 2 == 0 else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+    return value
+
+
+def geohash_bounds(value, bits):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    for i in range(bits):
+        rng = lon_range if i % 2 == 0 else lat_range
+        mid = (rng[0] + rng[1]) / 2
+        if value >> (bits - 1 - i) & 1:
+            rng[0] = mid
+        else:
+            rng[1] = mid
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cell_size_deg(bits):
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def km_per_degree_lon(lat):
+    return KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01)
+
+
+def bits_for_radius(lat, radius_km):
+    # smallest cells that are still at least as big as the radius, so a circle touches at most 3x3 of them
+    for bits in range(MAX_GEOHASH_BITS, 0, -1):
+        cell_lat, cell_lon = cell_size_deg(bits)
+        if min(cell_lat * KM_PER_DEGREE_LAT, cell_lon * km_per_degree_lon(lat)) >= radius_km:
+            return bits
+    return 1
+
+
+def cell_key(value, bits):
+    return f"{bits}:{value:x}"
+
+
+def parse_cell_key(key):
+    bits, value = key.split(":")
+    return int(value, 16), int(bits)
+
+
+def geohash_cells_covering(lat, lon, radius_km, bits=None):
+    bits = bits or bits_for_radius(lat, radius_km)
+    cell_lat, cell_lon = cell_size_deg(bits)
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlon = radius_km / km_per_degree_lon(lat)
+
+    lats = _steps(lat - dlat, lat + dlat, cell_lat)
+    lons = _steps(lon - dlon, lon + dlon, cell_lon)
+    return sorted({cell_key(geohash_bits(max(min(y, 90.0), -90.0), (x + 180.0) % 360.0 - 180.0, bits), bits)
+                   for y in lats for x in lons})
+
+
+def cell_circle(key):
+    # center of a cell and the radius (km) of the circle that contains all of it
+    min_lat, min_lon, max_lat, max_lon = geohash_bounds(*parse_cell_key(key))
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    return center_lat, center_lon, haversine_km(center_lat, center_lon, max_lat, max_lon)
+
+
+def _steps(start, stop, step):
+    values = []
+    value = start
+    while value < stop:
+        values.append(value)
+        value += step
+    values.append(stop)
+    return values
@@ -0,0 +1,129 @@
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+GEOLOCATION_URL = "https://www.googleapis.com/geolocation/v1/geolocate"
+GEOCODE_KIND = "geocode"
+
+# one spelling per street type and direction so "164 East 87th Street" and "164 E 87th St." share a key
+ADDRESS_ABBREVIATIONS = {
+    "street": "st", "str": "st", "avenue": "ave", "av": "ave", "road": "rd", "boulevard": "blvd",
+    "drive": "dr", "lane": "ln", "place": "pl", "court": "ct", "terrace": "ter", "parkway": "pkwy",
+    "highway": "hwy", "square": "sq", "circle": "cir", "plaza": "plz", "expressway": "expy",
+    "north": "n", "south": "s", "east": "e", "west": "w",
+    "northeast": "ne", "northwest": "nw", "southeast": "se", "southwest": "sw",
+    "saint": "st", "mount": "mt", "fort": "ft",
+}
+# "apt 4b", "suite 200", "# 12", "floor 3": the building geocodes the same without them
+# ("fl" is left alone, it is far more often florida than a floor)
+UNIT_PATTERN = re.compile(r'\b(apt|apartment|suite|ste|unit|room|rm|floor)\b\.?\s*[\w-]+|#\s*[\w-]+')
+COUNTRY_SUFFIXES = ("united states of america", "united states", "usa", "us")
+
+
+def canonical_address(address):
+    address = UNIT_PATTERN.sub(" ", (address or "").lower())
+    address = re.sub(r'[^\w\s]', ' ', address)
+    words = [ADDRESS_ABBREVIATIONS.get(word, word) for word in address.split()]
+    address = " ".join(words)
+    for suffix in COUNTRY_SUFFIXES:
+        if address.endswith(" " + suffix):
+            address = address[:-len(suffix) - 1]
+            break
+    return address
+
+
+class Geocoder:
+    # address -> (lat, lng), from memory, then the shared place store, then google
+
+    def __init__(self, api_key, store=None, ttl=90 * 24 * 3600, max_entries=10000, timeout=5):
+        self.api_key = api_key
+        self.store = store
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def geocode(self, address):
+        key = canonical_address(address)
+        if not key:
+            return None, None
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        point = self._load(key)
+        if point is None:
+            point = self._fetch(address)
+            if point is None:
+                return None, None
+            self._save(key, point)
+        self._remember(key, point)
+        return point
+
+    def locate(self):
+        # where the server thinks the caller is, from its ip, for clients that don't send coordinates.
+        # never cached, two requests can come from anywhere
+        try:
+            response = self.session.post(GEOLOCATION_URL, params={"key": self.api_key}, json={"considerIp": True},
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            location = response.json()["location"]
+        except Exception as e:
+            print(f"Geolocation failed: {str(e)}")
+            return None, None
+        return location["lat"], location["lng"]
+
+    def warm(self, addresses, max_workers=8):
+        # resolve a list of addresses ahead of time, returns how many of them resolved
+        addresses = list(dict.fromkeys(a for a in addresses if a))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            resolved = sum(point[0] is not None for point in executor.map(self.geocode, addresses))
+        print(f"Geocoded {resolved}/{len(addresses)} addresses")
+        return resolved
+
+    def _load(self, key):
+        if self.store is None:
+            return None
+        try:
+            point = self.store.get(GEOCODE_KIND, key, self.ttl)
+        except Exception as e:
+            print(f"Geocode cache read failed for {key}: {str(e)}")
+            return None
+        return tuple(point) if point else None
+
+    def _save(self, key, point):
+        if self.store is None:
+            return
+        try:
+            self.store.set(GEOCODE_KIND, key, list(point))
+        except Exception as e:
+            print(f"Geocode cache write failed for {key}: {str(e)}")
+
+    def _remember(self, key, point):
+        with self._lock:
+            self._memory[key] = point
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _fetch(self, address):
+        try:
+            response = self.session.get(GEOCODE_URL, params={"address": address, "key": self.api_key},
+                                        timeout=self.timeout)
+            response.raise_for_status()
+            results = response.json().get("results") or []
+        except Exception as e:
+            print(f"Geocoding failed for {address}: {str(e)}")
+            return None
+        if not results:
+            print(f"No geocoding result for {address}")
+            return None
+        location = results[0]["geometry"]["location"]
+        return location["lat"], location["lng"]
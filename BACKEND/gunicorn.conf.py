@@ -0,0 +1,26 @@
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py "app:create_app()"
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# app.py sizes each worker's image and job pools from this, the config is read before the app is loaded
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# requests mostly wait on google, gemini and mongo, so each worker also gets a few threads
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 4))
+# the app is imported once in the master, every client inside it is only built after the fork
+preload_app = True
+# route planning and long-polled jobs can legitimately take a while
+timeout = int(os.getenv("WEB_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then so slow leaks in client libraries never pile up
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+
+def post_worker_init(worker):
+    # build this worker's clients before it takes traffic, none of them opens a connection yet
+    from app import ensure_services
+    ensure_services()
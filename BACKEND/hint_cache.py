@@ -0,0 +1,148 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+
+def normalize_place_id(location_name):
+    # "Central Park ", "central-park" and "Central  Park" should all share one tree
+    return re.sub(r'[^a-z0-9]+', '_', (location_name or "").strip().lower()).strip('_')
+
+
+class HintTreeStore:
+    # in-process LRU in front of a mongo collection, with single-flight generation
+
+    def __init__(self, collection=None, max_entries=1024, ttl=7 * 24 * 3600, fallback_ttl=60, wait_timeout=30):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.wait_timeout = wait_timeout
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def ensure_indexes(self):
+        if self.collection is None:
+            return
+        # mongo drops expired trees on its own, the age check in _load_persistent covers the gap
+        self.collection.create_index("created_at", expireAfterSeconds=self.ttl)
+
+    def get(self, place_id):
+        hint_tree = self._get_memory(place_id)
+        if hint_tree is not None:
+            return hint_tree
+        hint_tree = self._load_persistent(place_id)
+        if hint_tree is not None:
+            self._put_memory(place_id, hint_tree, self.ttl)
+        return hint_tree
+
+    def put(self, place_id, hint_tree):
+        # fallback trees only live in memory for a short while so gemini gets retried soon
+        if hint_tree.get("is_fallback"):
+            self._put_memory(place_id, hint_tree, self.fallback_ttl)
+            return
+        self._put_memory(place_id, hint_tree, self.ttl)
+        if self.collection is None:
+            return
+        try:
+            self.collection.replace_one(
+                {"_id": place_id},
+                {"_id": place_id, "hint_tree": hint_tree, "created_at": datetime.utcnow()},
+                upsert=True)
+        except Exception as e:
+            print(f"Error saving hint tree for {place_id}: {str(e)}")
+
+    def get_or_create(self, location_name, generate):
+        place_id = normalize_place_id(location_name)
+        hint_tree = self.get(place_id)
+        if hint_tree is not None:
+            return hint_tree
+
+        with self._lock:
+            event = self._inflight.get(place_id)
+            is_leader = event is None
+            if is_leader:
+                event = threading.Event()
+                self._inflight[place_id] = event
+
+        if not is_leader:
+            # someone else at this checkpoint is already asking gemini, wait for their tree
+            event.wait(self.wait_timeout)
+            hint_tree = self.get(place_id)
+            if hint_tree is not None:
+                return hint_tree
+            return generate(location_name)
+
+        try:
+            hint_tree = generate(location_name)
+            self.put(place_id, hint_tree)
+            return hint_tree
+        finally:
+            with self._lock:
+                self._inflight.pop(place_id, None)
+            event.set()
+
+    def get_or_create_many(self, location_names, generate_many):
+        # one generate_many call for every name that has no tree and isn't already being generated,
+        # generate_many returns {location name: tree} and may leave names out
+        missing = {}
+        for name in location_names:
+            place_id = normalize_place_id(name)
+            if place_id not in missing and self.get(place_id) is None:
+                missing[place_id] = name
+
+        claimed = {}
+        with self._lock:
+            for place_id, name in missing.items():
+                if place_id not in self._inflight:
+                    self._inflight[place_id] = threading.Event()
+                    claimed[place_id] = name
+        if not claimed:
+            return 0
+
+        try:
+            hint_trees = generate_many(list(claimed.values()))
+            for place_id, name in claimed.items():
+                if name in hint_trees:
+                    self.put(place_id, hint_trees[name])
+            return len(hint_trees)
+        finally:
+            with self._lock:
+                events = [self._inflight.pop(place_id) for place_id in claimed]
+            for event in events:
+                event.set()
+
+    def _get_memory(self, place_id):
+        with self._lock:
+            entry = self._lru.get(place_id)
+            if entry is None:
+                return None
+            hint_tree, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._lru[place_id]
+                return None
+            self._lru.move_to_end(place_id)
+            return hint_tree
+
+    def _put_memory(self, place_id, hint_tree, ttl):
+        with self._lock:
+            self._lru[place_id] = (hint_tree, time.monotonic() + ttl)
+            self._lru.move_to_end(place_id)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def _load_persistent(self, place_id):
+        if self.collection is None:
+            return None
+        try:
+            doc = self.collection.find_one({"_id": place_id})
+        except Exception as e:
+            print(f"Error loading hint tree for {place_id}: {str(e)}")
+            return None
+        if not doc:
+            return None
+        if doc.get("created_at") and doc["created_at"] < datetime.utcnow() - timedelta(seconds=self.ttl):
+            return None
+        return doc.get("hint_tree")
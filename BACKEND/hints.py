@@ -0,0 +1,141 @@
+import base64
+import hashlib
+import hmac
+import json
+import zlib
+
+from llm import extract_json
+from hint_cache import normalize_place_id
+
+# trees for this many stops are asked for in one prompt
+HINT_BATCH_SIZE = 5
+HINT_TOKENS_PER_TREE = 1000
+FINAL_HINT_ID = "final"
+MAX_HINT_STEPS = 3
+TREE_TOKEN_VERSION = "v1"
+TREE_TOKEN_SIG_BYTES = 16
+
+TREE_FORMAT = """{"1": {"text": "...", "type": "symbolic", "on_understood": "2A", "on_confused": "2B"},
+     "2A": {"text": "...", "type": "historical", "on_understood": "3A", "on_confused": "3B"}, ...}
+    Every on_understood/on_confused is the id of another hint in the same tree or "final",
+    hints get more direct further down, and every path ends in "final" within 4 steps"""
+
+
+def validate_hint_tree(hint_tree):
+    # every link points at a real hint or "final", no loops, and every path from "1" ends in final
+    tree = hint_tree.get("tree") if isinstance(hint_tree, dict) else None
+    if not isinstance(tree, dict) or "1" not in tree:
+        return False
+    for node in tree.values():
+        if not isinstance(node, dict) or not node.get("text"):
+            return False
+        for link in (node.get("on_understood"), node.get("on_confused")):
+            if link is not None and link != FINAL_HINT_ID and link not in tree:
+                return False
+
+    visiting, finished = set(), set()
+
+    def ends_in_final(hint_id):
+        if hint_id is None or hint_id == FINAL_HINT_ID or hint_id in finished:
+            return True
+        if hint_id in visiting:
+            return False
+        visiting.add(hint_id)
+        node = tree[hint_id]
+        ok = ends_in_final(node.get("on_understood")) and ends_in_final(node.get("on_confused"))
+        visiting.discard(hint_id)
+        finished.add(hint_id)
+        return ok
+
+    return ends_in_final("1")
+
+
+def generate_hint_tree(llm, location_name):
+    prompt = f"""Generate hints for a location quiz about {location_name}. Return only JSON:
+    {{"place_id": "{normalize_place_id(location_name)}", "tree": {TREE_FORMAT}}}"""
+    try:
+        hint_tree = extract_json(llm.generate(prompt, kind="hint_tree", temperature=0.2,
+                                              max_output_tokens=HINT_TOKENS_PER_TREE))
+        if validate_hint_tree(hint_tree):
+            return hint_tree
+        print(f"[WARN] generate_hint_tree: invalid hint tree for {location_name}")
+    except Exception as e:
+        print(f"Error generating hint tree for {location_name}: {str(e)}")
+    llm.fallback("hint_tree")
+    return fallback_hint_tree(location_name)
+
+
+def generate_hint_trees(llm, location_names):
+    # {location name: tree} from one prompt, invalid or missing trees are left out for the lazy path
+    names = "\n".join(f"- {name}" for name in location_names)
+    prompt = f"""Generate hints for a location quiz about each of these places:
+    {names}
+    Return only JSON with one entry per place, keyed by the place name exactly as written above:
+    {{"<place name>": {{"tree": {TREE_FORMAT}}}, ...}}"""
+    try:
+        data = extract_json(llm.generate(prompt, kind="hint_trees", temperature=0.2,
+                                         max_output_tokens=HINT_TOKENS_PER_TREE * len(location_names)))
+    except Exception as e:
+        print(f"Error generating hint trees for {len(location_names)} locations: {str(e)}")
+        return {}
+
+    # match keys loosely, the model sometimes changes case or punctuation
+    by_place_id = {normalize_place_id(name): value for name, value in data.items()}
+    hint_trees = {}
+    for name in location_names:
+        hint_tree = by_place_id.get(normalize_place_id(name))
+        if validate_hint_tree(hint_tree):
+            hint_trees[name] = {"place_id": normalize_place_id(name), "tree": hint_tree["tree"]}
+        else:
+            print(f"[WARN] generate_hint_trees: invalid hint tree for {name}")
+    return hint_trees
+
+
+def fallback_hint_tree(location_name):
+    return {"place_id": normalize_place_id(location_name), "is_fallback": True,
+            "tree": {"1": {"text": "Popular destination", "type": "symbolic", "on_understood": None, "on_confused": None}}}
+
+
+def final_hint(location_name):
+    return {"hint": {"id": FINAL_HINT_ID, "text": f"The answer is {location_name}.", "type": "factual"}, "is_final": True}
+
+
+def next_hint(hint_tree, location_name, previous_hint_id=None, user_response=None, reject_count=0, accept_count=0):
+    # one quiz step, pure so it can run on a tree from anywhere: the store, a token or the client
+    if previous_hint_id == FINAL_HINT_ID or reject_count >= MAX_HINT_STEPS or accept_count >= MAX_HINT_STEPS:
+        return final_hint(location_name)
+    tree = hint_tree["tree"]
+    if previous_hint_id is None:
+        return {"hint": {"id": "1", **tree["1"]}, "is_final": False}
+
+    current = tree.get(previous_hint_id) or {}
+    next_hint_id = current.get("on_understood" if user_response == "understood" else "on_confused")
+    if next_hint_id is None or next_hint_id not in tree:
+        return final_hint(location_name)
+    return {"hint": {"id": next_hint_id, **tree[next_hint_id]}, "is_final": False}
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def encode_tree_token(hint_tree, secret):
+    # compressed tree plus a truncated hmac, small enough to hand to the client with the first hint
+    payload = _b64(zlib.compress(json.dumps(hint_tree, separators=(",", ":")).encode(), 9))
+    signature = hmac.new(secret, f"{TREE_TOKEN_VERSION}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{TREE_TOKEN_VERSION}.{payload}.{_b64(signature[:TREE_TOKEN_SIG_BYTES])}"
+
+
+def decode_tree_token(token, secret):
+    try:
+        version, payload, signature = token.split(".")
+    except (AttributeError, ValueError):
+        raise ValueError("Malformed hint tree token")
+    expected = hmac.new(secret, f"{version}.{payload}".encode(), hashlib.sha256).digest()[:TREE_TOKEN_SIG_BYTES]
+    if version != TREE_TOKEN_VERSION or not hmac.compare_digest(_unb64(signature), expected):
+        raise ValueError("Invalid hint tree token")
+    return json.loads(zlib.decompress(_unb64(payload)))
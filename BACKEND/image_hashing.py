@@ -0,0 +1,100 @@
+import base64
+import binascii
+import os
+from io import BytesIO
+
+MAX_IMAGE_BYTES = 12 * 1024 * 1024
+# refuse decompression bombs long before PIL allocates the full frame
+MAX_IMAGE_PIXELS = 40_000_000
+# jpeg draft mode decodes at 1/2, 1/4 or 1/8 scale straight to at least this size,
+# plenty for a 32x32 phash, 9x8 dhash and the wavelet pyramid of whash
+DRAFT_SIZE = (256, 256)
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def decode_base64_image(image_base64, max_bytes=MAX_IMAGE_BYTES):
+    if not isinstance(image_base64, str):
+        raise InvalidImage("Image must be a base64 string")
+    # check the encoded length first so an oversized upload is never decoded
+    if len(image_base64) * 3 // 4 > max_bytes:
+        raise ImageTooLarge(f"Image is larger than {max_bytes // (1024 * 1024)} MB")
+    if "," in image_base64[:100]:
+        # data:image/jpeg;base64,... from some clients
+        image_base64 = image_base64.split(",", 1)[1]
+    if "\n" in image_base64:
+        # mime-style line wrapping, validate=True would refuse it
+        image_base64 = "".join(image_base64.split())
+    try:
+        # validate so stray characters are an error instead of being silently dropped
+        return base64.b64decode(image_base64, validate=True)
+    except binascii.Error as e:
+        raise InvalidImage(f"Invalid base64 image: {e}")
+
+
+def read_upload(upload, max_bytes=MAX_IMAGE_BYTES):
+    data = upload.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageTooLarge(f"Image is larger than {max_bytes // (1024 * 1024)} MB")
+    return data
+
+
+def load_reduced_image(image_bytes):
+    # PIL is imported here, the web process only ever checks sizes and decodes base64
+    from PIL import Image
+
+    try:
+        image = Image.open(BytesIO(image_bytes))
+        if image.width * image.height > MAX_IMAGE_PIXELS:
+            raise ImageTooLarge("Image has too many pixels")
+        # greyscale + downscale inside the jpeg decoder, other formats still decode in full
+        image.draft('L', DRAFT_SIZE)
+        image = image.convert('L')  # greyscale works better for pHash
+    except Image.DecompressionBombError:
+        raise ImageTooLarge("Image has too many pixels")
+    except OSError:
+        # UnidentifiedImageError and truncated files, the upload is not an image we can read
+        raise InvalidImage("Upload is not a readable image")
+    if max(image.size) > 2 * max(DRAFT_SIZE):
+        image.thumbnail((2 * DRAFT_SIZE[0], 2 * DRAFT_SIZE[1]), Image.Resampling.BOX)
+    return image
+
+
+def hash_image_bytes(image_bytes):
+    # one decode, every hash computed from the same reduced greyscale buffer
+    import imagehash
+
+    image = load_reduced_image(image_bytes)
+    return {
+        "phash": str(imagehash.phash(image)),
+        "dhash": str(imagehash.dhash(image)),
+        "whash": str(imagehash.whash(image)),
+    }
+
+
+def hash_image_batch(images):
+    # several uploads in one worker call, a bad image only fails its own slot
+    results = []
+    for image_bytes in images:
+        try:
+            results.append(hash_image_bytes(image_bytes))
+        except Exception as e:
+            results.append({"error": str(e)})
+    return results
+
+
+def hash_image_file(path, max_bytes=MAX_IMAGE_BYTES):
+    # (path, hashes or {"error"}), reads inside the worker so only the path crosses the process boundary
+    try:
+        if os.path.getsize(path) > max_bytes:
+            raise ImageTooLarge(f"Image is larger than {max_bytes // (1024 * 1024)} MB")
+        with open(path, "rb") as f:
+            return path, hash_image_bytes(f.read())
+    except Exception as e:
+        return path, {"error": str(e)}
@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from image_hashing import hash_image_bytes, hash_image_batch
+
+
+class ImagePoolBusy(Exception):
+    pass
+
+
+class ImageTaskTimeout(Exception):
+    pass
+
+
+def _context():
+    # workers fork from a small server that only imported PIL/imagehash, never from the threaded web
+    # process, and never re-run app.py the way spawn would
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["image_hashing", "PIL.Image", "imagehash"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class ImagePool:
+    # decoding and hashing run in their own processes so they can't starve the web threads
+
+    def __init__(self, max_workers=None, max_pending=None, timeout=10):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def hash(self, image_bytes):
+        return self._call(hash_image_bytes, image_bytes)
+
+    def hash_many(self, images):
+        # one worker call per chunk, chunks spread over every worker, results line up with images
+        images = list(images)
+        if not images:
+            return []
+        size = -(-len(images) // self.max_workers)
+        chunks = [images[i:i + size] for i in range(0, len(images), size)]
+        submitted = []
+        try:
+            for chunk in chunks:
+                submitted.append(self._submit(hash_image_batch, chunk))
+        except Exception:
+            for future, _ in submitted:
+                future.cancel()
+            raise
+        timeout = self.timeout * max(1, size)
+        return [result for future, executor in submitted for result in self._result(future, executor, timeout)]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _call(self, fn, arg):
+        future, executor = self._submit(fn, arg)
+        return self._result(future, executor, self.timeout)
+
+    def _submit(self, fn, arg):
+        # full queue means fail fast so the client backs off, instead of piling up web threads
+        if not self._slots.acquire(blocking=False):
+            raise ImagePoolBusy("Image workers are busy")
+        executor = self._pool()
+        try:
+            future = executor.submit(fn, arg)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset(executor)
+            raise
+        except Exception:
+            self._slots.release()
+            raise
+        # the slot frees up when the worker is done, not when we stop waiting on it
+        future.add_done_callback(lambda f: self._slots.release())
+        return future, executor
+
+    def _result(self, future, executor, timeout):
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            raise ImageTaskTimeout("Image processing timed out")
+        except BrokenProcessPool:
+            # a worker died (usually oom on a huge image), start a fresh pool for the next request
+            print("[WARN] ImagePool: worker process died, restarting pool")
+            self._reset(executor)
+            raise
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_context())
+            return self._executor
+
+    def _reset(self, broken):
+        # only drop the pool that actually broke, another thread may have replaced it already
+        with self._lock:
+            if self._executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
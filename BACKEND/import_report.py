@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# what the first /check_user_location of a fresh worker is allowed to cost, process start included
+COLD_START_BUDGET_MS = 300
+# these are meant to load only on the routes that need them, never at startup
+HEAVY_MODULES = ("numpy", "PIL", "imagehash", "scipy", "pywt", "pymongo", "google.genai", "supabase", "requests")
+
+COLD_START_SCRIPT = """
+import json, sys, time
+started = float(sys.argv[1])
+import app
+imported = time.time()
+client = app.create_app().test_client()
+response = client.post("/check_user_location", json={"lat": 40.7794, "lng": -73.9632,
+                                                      "target_lat": 40.7794, "target_lon": -73.9632})
+done = time.time()
+print(json.dumps({"status": response.status_code, "import_ms": (imported - started) * 1000,
+                  "first_response_ms": (done - started) * 1000,
+                  "loaded": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def run_python(args):
+    return subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+
+
+def import_costs(module="app"):
+    # [(module, self us, cumulative us, depth)] in import order, from python -X importtime
+    stderr = run_python(["-X", "importtime", "-c", f"import {module}"]).stderr
+    costs = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        costs.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return costs
+
+
+def direct_imports(costs, module):
+    # importtime lists children before their parent, so module's own imports are the depth 1
+    # lines right above it, interpreter startup imports come before those
+    position = max(i for i, (name, _, _, depth) in enumerate(costs) if name == module and depth == 0)
+    imports = []
+    for name, _, cumulative_us, depth in reversed(costs[:position]):
+        if depth == 0:
+            break
+        if depth == 1:
+            imports.append((name, cumulative_us))
+    return imports
+
+
+def package_costs(costs):
+    # self time summed per top-level package, so "numpy" covers every numpy submodule
+    totals = defaultdict(int)
+    for name, self_us, _, _ in costs:
+        totals[name.split(".")[0]] += self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def cold_start():
+    started = time.time()
+    result = run_python(["-c", COLD_START_SCRIPT, repr(started), *HEAVY_MODULES])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_report(module="app", top=20):
+    costs = import_costs(module)
+    total_us = next((cumulative for name, _, cumulative, _ in costs if name == module), 0)
+    print(f"import {module}: {total_us / 1000:.1f} ms")
+    print("\nslowest packages (self time):")
+    for package, self_us in package_costs(costs)[:top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+    print(f"\nimported directly by {module} (cumulative):")
+    for name, cumulative_us in sorted(direct_imports(costs, module), key=lambda item: item[1], reverse=True):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-module import cost and cold start time of the backend")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=20, help="how many packages to list")
+    parser.add_argument("--budget-ms", type=float, default=COLD_START_BUDGET_MS,
+                        help="exit non-zero when the first /check_user_location takes longer than this")
+    args = parser.parse_args()
+
+    print_report(args.module, args.top)
+    result = cold_start()
+    print(f"\nprocess start -> app imported: {result['import_ms']:.0f} ms")
+    print(f"process start -> first /check_user_location ({result['status']}): {result['first_response_ms']:.0f} ms")
+    if result["loaded"]:
+        print(f"[WARN] loaded before the first response: {', '.join(result['loaded'])}")
+    if result["first_response_ms"] > args.budget_ms:
+        sys.exit(f"cold start over budget: {result['first_response_ms']:.0f} ms > {args.budget_ms:.0f} ms")
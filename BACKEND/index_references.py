@@ -0,0 +1,121 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+from image_hashing import hash_image_file
+from phash_index import PhashIndex
+from reference_ingest import dedupe_references, insert_references, DUPLICATE_DISTANCE, INSERT_BATCH_SIZE
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+HASH_CHUNK_SIZE = 32
+
+
+def directory_entries(root, url_prefix=""):
+    # <root>/<location name>/**/<photo>, stored image_path is the url prefix plus the relative path
+    entries = []
+    for location_name in sorted(os.listdir(root)):
+        location_dir = os.path.join(root, location_name)
+        if not os.path.isdir(location_dir):
+            continue
+        for folder, _, files in sorted(os.walk(location_dir)):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                path = os.path.join(folder, name)
+                relative = os.path.relpath(path, root).replace(os.sep, "/")
+                entries.append({"location_name": location_name, "path": path, "image_path": url_prefix + relative})
+    return entries
+
+
+def manifest_entries(manifest, url_prefix=""):
+    # csv or jsonl with location_name, path and optionally image_path, paths relative to the manifest
+    base = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, newline="") as f:
+        if manifest.endswith(".csv"):
+            records = list(csv.DictReader(f))
+        else:
+            records = [json.loads(line) for line in f if line.strip()]
+    return [{
+        "location_name": record["location_name"],
+        "path": os.path.join(base, record["path"]),
+        "image_path": record.get("image_path") or url_prefix + record["path"],
+    } for record in records]
+
+
+def open_progress(path):
+    progress = sqlite3.connect(path)
+    progress.execute("CREATE TABLE IF NOT EXISTS indexed (path TEXT PRIMARY KEY, status TEXT NOT NULL)")
+    progress.commit()
+    return progress
+
+
+def index_references(entries, supabase, table, progress, workers=None, max_distance=DUPLICATE_DISTANCE,
+                     batch_size=INSERT_BATCH_SIZE):
+    # failed photos are retried on the next run, inserted and duplicate ones are skipped
+    done = {path for (path,) in progress.execute("SELECT path FROM indexed WHERE status != 'failed'")}
+    todo = [entry for entry in entries if entry["path"] not in done]
+    print(f"{len(entries) - len(todo)} photos already indexed, {len(todo)} to go")
+
+    index = PhashIndex(supabase, table, refresh_interval=float("inf"))
+    index.load()
+
+    counts = {"inserted": 0, "duplicate": 0, "failed": 0}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # hashing runs ahead on every core while each finished batch is deduped and inserted
+        hashed = executor.map(hash_image_file, [entry["path"] for entry in todo], chunksize=HASH_CHUNK_SIZE)
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            statuses = {}
+            rows = []
+            for entry, (path, hashes) in zip(batch, islice(hashed, len(batch))):
+                if "error" in hashes:
+                    print(f"[WARN] {path}: {hashes['error']}")
+                    statuses[path] = "failed"
+                    continue
+                rows.append({"location_name": entry["location_name"].strip(), "image_hash": hashes["phash"],
+                             "image_path": entry["image_path"], "path": path})
+
+            kept, duplicates = dedupe_references(rows, index, max_distance)
+            inserted = insert_references(supabase, table, [{k: v for k, v in row.items() if k != "path"} for row in kept])
+            index.add(inserted)
+            statuses.update({row["path"]: "inserted" for row in kept})
+            statuses.update({row["path"]: "duplicate" for row in duplicates})
+
+            # only recorded once the rows are in supabase, a crash before this just redoes the batch
+            # and the exact duplicates it would insert get caught by the dedupe above
+            progress.executemany("INSERT OR REPLACE INTO indexed (path, status) VALUES (?, ?)", statuses.items())
+            progress.commit()
+            for status in statuses.values():
+                counts[status] += 1
+            print(f"Indexed {start + len(batch)}/{len(todo)}: {counts['inserted']} inserted, "
+                  f"{counts['duplicate']} duplicates, {counts['failed']} failed")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hash reference photos and add them to the checkpoints table")
+    parser.add_argument("source", help="directory of <location name>/<photo> folders, or a .csv/.jsonl manifest")
+    parser.add_argument("--url-prefix", default="", help="prepended to relative paths to build image_path")
+    parser.add_argument("--progress", default="index_progress.sqlite3", help="resume file")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-distance", type=int, default=DUPLICATE_DISTANCE,
+                        help="skip photos this close to an existing reference of the same location")
+    parser.add_argument("--batch-size", type=int, default=INSERT_BATCH_SIZE)
+    parser.add_argument("--table", default="checkpoints")
+    args = parser.parse_args()
+
+    load_dotenv()
+    supabase = create_client(os.getenv("SUPABASE_URL", "").strip(), os.getenv("SUPABASE_KEY", "").strip())
+    if os.path.isdir(args.source):
+        entries = directory_entries(args.source, args.url_prefix)
+    else:
+        entries = manifest_entries(args.source, args.url_prefix)
+    index_references(entries, supabase, args.table, open_progress(args.progress), args.workers,
+                     args.max_distance, args.batch_size)
@@ -0,0 +1,197 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+POLL_INTERVAL = 0.5
+# running jobs are touched this often, a job not touched for stale_after has lost its worker
+HEARTBEAT_INTERVAL = 10
+
+
+def pid_alive(pid):
+    # the store is a local sqlite file, so every worker sharing it runs on this host
+    if pid is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    # route jobs live in sqlite so a restarted web worker picks up where the old one stopped
+
+    def __init__(self, path, run, max_workers=4, stale_after=6 * HEARTBEAT_INTERVAL, keep_for=3600,
+                 heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.path = path
+        self.run = run
+        self.stale_after = stale_after
+        self.heartbeat_interval = heartbeat_interval
+        self.keep_for = keep_for
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._local = threading.local()
+        self._events = {}
+        self._lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, fingerprint TEXT, status TEXT NOT NULL, params TEXT NOT NULL, "
+            "result TEXT, error TEXT, worker TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_fingerprint ON jobs (fingerprint, status)")
+        # stores created before heartbeats existed
+        for column in ("pid INTEGER", "heartbeat REAL"):
+            try:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass
+        conn.commit()
+
+        self._sweeper = threading.Thread(target=self._heartbeat, name="jobs-heartbeat", daemon=True)
+        self._sweeper.start()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def submit(self, params, fingerprint=None):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, now - self.keep_for))
+            # identical requests already in flight share one job, unless its worker is gone
+            if fingerprint:
+                rows = conn.execute(
+                    "SELECT id, status, pid, heartbeat, updated_at FROM jobs WHERE fingerprint = ? AND status IN (?, ?) "
+                    "ORDER BY created_at", (fingerprint, QUEUED, RUNNING)).fetchall()
+                row = next((row for row in rows if row["status"] == QUEUED or self._owner_alive(row, now)), None)
+                if row:
+                    conn.execute("COMMIT")
+                    return row["id"]
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, fingerprint, status, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, fingerprint, QUEUED, json.dumps(params), now, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.executor.submit(self._run, job_id)
+        return job_id
+
+    def resume(self):
+        # jobs whose worker died mid-run go back in the queue, then everything queued gets picked up
+        self.requeue_orphans()
+        for row in self._conn().execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall():
+            self.executor.submit(self._run, row["id"])
+
+    def requeue_orphans(self):
+        # running jobs whose process exited or stopped heartbeating, and queued jobs nobody picked up
+        # (they were waiting in a dead worker's executor), are run here instead
+        now = time.time()
+        conn = self._conn()
+        rows = conn.execute("SELECT id, worker, pid, heartbeat, updated_at FROM jobs WHERE status = ? AND worker != ?",
+                            (RUNNING, self.worker_id)).fetchall()
+        for row in rows:
+            if self._owner_alive(row, now):
+                continue
+            # only if the dead worker still holds it, another sweeper may have taken it already
+            if conn.execute("UPDATE jobs SET status = ?, worker = NULL, pid = NULL, updated_at = ? "
+                            "WHERE id = ? AND status = ? AND worker = ?",
+                            (QUEUED, now, row["id"], RUNNING, row["worker"])).rowcount:
+                print(f"[WARN] Re-queued route job {row['id']} from worker {row['worker']}")
+                self.executor.submit(self._run, row["id"])
+
+        for row in conn.execute("SELECT id FROM jobs WHERE status = ? AND updated_at < ?",
+                                (QUEUED, now - self.stale_after)).fetchall():
+            if conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ? AND updated_at < ?",
+                            (now, row["id"], QUEUED, now - self.stale_after)).rowcount:
+                self.executor.submit(self._run, row["id"])
+
+    def get(self, job_id, raw=False):
+        # raw=True leaves the stored result as its json text so it can be sent without a re-parse
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        job = {"job_id": row["id"], "status": row["status"]}
+        if row["status"] == DONE:
+            job["result"] = row["result"] if raw else json.loads(row["result"])
+        if row["status"] == FAILED:
+            job["error"] = row["error"]
+        return job
+
+    def wait(self, job_id, timeout, raw=False):
+        # long-poll, woken directly for jobs run here and by polling for jobs run by another worker
+        deadline = time.monotonic() + timeout
+        event = self._event(job_id)
+        while True:
+            job = self.get(job_id, raw)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in (DONE, FAILED):
+                with self._lock:
+                    self._events.pop(job_id, None)
+                return job
+            if remaining <= 0:
+                return job
+            event.wait(min(POLL_INTERVAL, remaining))
+
+    def _run(self, job_id):
+        conn = self._conn()
+        now = time.time()
+        claimed = conn.execute(
+            "UPDATE jobs SET status = ?, worker = ?, pid = ?, heartbeat = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (RUNNING, self.worker_id, os.getpid(), now, now, job_id, QUEUED)).rowcount
+        if not claimed:
+            return
+
+        params = json.loads(conn.execute("SELECT params FROM jobs WHERE id = ?", (job_id,)).fetchone()["params"])
+        try:
+            result = self.run(params)
+            conn.execute("UPDATE jobs SET status = ?, result = ?, updated_at = ? WHERE id = ?",
+                         (DONE, json.dumps(result), time.time(), job_id))
+        except Exception as e:
+            print(f"Route job {job_id} failed: {str(e)}")
+            conn.execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                         (FAILED, str(e), time.time(), job_id))
+        finally:
+            with self._lock:
+                event = self._events.pop(job_id, None)
+            if event:
+                event.set()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self._conn().execute("UPDATE jobs SET heartbeat = ? WHERE status = ? AND worker = ?",
+                                     (time.time(), RUNNING, self.worker_id))
+                self.requeue_orphans()
+            except Exception as e:
+                print(f"[WARN] Job heartbeat failed: {str(e)}")
+
+    def _owner_alive(self, row, now):
+        # rows from before heartbeats only have updated_at to go on
+        heartbeat = row["heartbeat"] if row["heartbeat"] is not None else row["updated_at"]
+        return heartbeat >= now - self.stale_after and pid_alive(row["pid"])
+
+    def _event(self, job_id):
+        with self._lock:
+            return self._events.setdefault(job_id, threading.Event())
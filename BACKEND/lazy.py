@@ -0,0 +1,32 @@
+import threading
+
+
+class LazyClient:
+    # stands in for a client until something actually calls it, so a worker only imports and builds
+    # the libraries its routes touch (genai on hint routes, supabase and numpy on image routes, ...)
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    @property
+    def loaded(self):
+        return self._client is not None
+
+    def __getattr__(self, name):
+        # copy/pickle probe dunders before __init__ has run, never build the client for those
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __getitem__(self, key):
+        # db["inputs"] stays lazy too, nothing connects until a collection is queried
+        return LazyClient(lambda: self.get()[key])
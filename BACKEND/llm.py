@@ -0,0 +1,269 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+DEFAULT_MODEL = 'gemini-2.0-flash-001'
+LATENCY_SAMPLES = 500
+RATE_LIMIT_STATUS = 429
+RETRIES = 3
+BACKOFF = 1.0
+
+
+class LLMUnavailable(Exception):
+    pass
+
+
+def extract_json(text):
+    return json.loads(re.search(r'({.*})', text, re.DOTALL).group(1))
+
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        # waits for a token rather than failing, callers only give up after timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def drain(self, seconds):
+        # google said we are over quota, stop handing out tokens for a while
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+            self._updated = time.monotonic()
+
+
+class CallStats:
+
+    def __init__(self):
+        # what callers asked for, however it was answered or failed
+        self.requests = 0
+        self.calls = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.batched = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.fallbacks = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self):
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "batched": self.batched,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "fallbacks": self.fallbacks,
+            "fallback_rate": round(self.fallbacks / self.requests, 4) if self.requests else 0.0,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "latency_ms_p50": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "latency_ms_p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+        }
+
+
+class GeminiManager:
+    # every gemini call in the app goes through here: one quota, one cache, one set of metrics
+
+    def __init__(self, client, requests_per_minute=60, burst=10, max_concurrency=8, max_wait=20,
+                 cache_size=1024, cache_ttl=3600, batch_window=0.05, max_batch=8):
+        self.client = client
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._pending = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, kind="other", model=DEFAULT_MODEL, temperature=0.2, max_output_tokens=1000,
+                 cache=True, response_schema=None):
+        # response text, identical prompts share one call and are answered from cache for cache_ttl
+        self._count(kind, "requests")
+        return self._generate(prompt, kind, model, temperature, max_output_tokens, cache, response_schema)
+
+    def _generate(self, prompt, kind, model, temperature, max_output_tokens, cache=True, response_schema=None):
+        key = hashlib.sha256(json.dumps([model, prompt, temperature, max_output_tokens, response_schema],
+                                        sort_keys=True).encode()).hexdigest()
+        if cache:
+            text = self._cached(key)
+            if text is not None:
+                self._count(kind, "cache_hits")
+                return text
+
+        with self._lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+        if not is_leader:
+            self._count(kind, "coalesced")
+            return future.result()
+
+        try:
+            text = self._call(prompt, kind, model, temperature, max_output_tokens, response_schema)
+            if cache:
+                self._remember(key, text)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def generate_json_batched(self, prompt, kind="other", model=DEFAULT_MODEL, temperature=0.2, max_output_tokens=800):
+        # small json prompts arriving within batch_window of each other share one request
+        self._count(kind, "requests")
+        group = (kind, model, temperature)
+        future = Future()
+        with self._lock:
+            batch = self._pending.get(group)
+            if batch is None:
+                batch = self._pending[group] = []
+                timer = threading.Timer(self.batch_window, self._flush, (group, model, temperature))
+                timer.daemon = True
+                timer.start()
+            batch.append((prompt, max_output_tokens, future))
+            full = len(batch) >= self.max_batch
+        if full:
+            self._flush(group, model, temperature)
+        return future.result()
+
+    def fallback(self, kind):
+        # callers report when they had to use canned output, that's the number that matters
+        self._count(kind, "fallbacks")
+
+    def metrics(self):
+        with self._lock:
+            return {kind: stats.snapshot() for kind, stats in self._stats.items()}
+
+    def _flush(self, group, model, temperature):
+        with self._lock:
+            batch = self._pending.pop(group, None)
+        if not batch:
+            return
+        kind = group[0]
+        if len(batch) == 1:
+            prompt, max_output_tokens, future = batch[0]
+            self._resolve(future, lambda: extract_json(self._generate(prompt, kind, model, temperature, max_output_tokens)))
+            return
+
+        tasks = "\n\n".join(f"Task {i + 1}:\n{prompt}" for i, (prompt, _, _) in enumerate(batch))
+        combined = f"""Answer each of these {len(batch)} independent tasks.
+        Return only JSON: {{"1": <the JSON answer to task 1>, "2": <the JSON answer to task 2>, ...}}
+
+        {tasks}"""
+        try:
+            answers = extract_json(self._generate(combined, kind, model, temperature,
+                                                  sum(tokens for _, tokens, _ in batch)))
+        except Exception as e:
+            print(f"[WARN] GeminiManager: batched {kind} call failed, retrying one by one: {e}")
+            answers = {}
+        for i, (prompt, max_output_tokens, future) in enumerate(batch):
+            answer = answers.get(str(i + 1))
+            if isinstance(answer, dict):
+                self._count(kind, "batched")
+                future.set_result(answer)
+            else:
+                self._resolve(future, lambda: extract_json(self._generate(prompt, kind, model, temperature, max_output_tokens)))
+
+    def _resolve(self, future, fn):
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+
+    def _call(self, prompt, kind, model, temperature, max_output_tokens, response_schema=None):
+        # google.genai takes half a second to import, only pay it once something is actually asked
+        from google.genai import types
+
+        config = types.GenerateContentConfig(temperature=temperature, max_output_tokens=max_output_tokens)
+        if response_schema is not None:
+            # structured output, gemini itself keeps the reply inside the schema
+            config = types.GenerateContentConfig(temperature=temperature, max_output_tokens=max_output_tokens,
+                                                 response_mime_type="application/json", response_schema=response_schema)
+        for attempt in range(RETRIES + 1):
+            if not self.bucket.acquire(self.max_wait):
+                self._count(kind, "rate_limited")
+                raise LLMUnavailable("Gemini quota exhausted, gave up waiting for a slot")
+            with self._slots:
+                started = time.monotonic()
+                try:
+                    response = self.client.models.generate_content(model=model, contents=prompt, config=config)
+                except Exception as e:
+                    if getattr(e, "code", None) != RATE_LIMIT_STATUS or attempt == RETRIES:
+                        self._count(kind, "errors")
+                        raise
+                    # back off everyone, not just this caller, then try again
+                    self._count(kind, "rate_limited")
+                    self.bucket.drain(BACKOFF * 2 ** attempt * (1 + random.random()))
+                    continue
+            self._record(kind, time.monotonic() - started, getattr(response, "usage_metadata", None))
+            return response.text
+
+    def _record(self, kind, latency, usage):
+        with self._lock:
+            stats = self._stats.setdefault(kind, CallStats())
+            stats.calls += 1
+            stats.latencies.append(latency)
+            if usage is not None:
+                stats.prompt_tokens += getattr(usage, "prompt_token_count", None) or 0
+                stats.output_tokens += getattr(usage, "candidates_token_count", None) or 0
+
+    def _count(self, kind, field):
+        with self._lock:
+            stats = self._stats.setdefault(kind, CallStats())
+            setattr(stats, field, getattr(stats, field) + 1)
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[0]
+
+    def _remember(self, key, text):
+        with self._lock:
+            self._cache[key] = (text, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
@@ -0,0 +1,183 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# names and descriptions for a whole route set come back in one structured reply
+ROUTE_NAMES_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "clusters": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "cluster_id": {"type": "INTEGER"},
+                    "cluster_name": {"type": "STRING"},
+                    "cluster_description": {"type": "STRING"},
+                },
+                "required": ["cluster_id", "cluster_name", "cluster_description"],
+            },
+        },
+        "stops": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"stop_id": {"type": "STRING"}, "mystery_name": {"type": "STRING"}},
+                "required": ["stop_id", "mystery_name"],
+            },
+        },
+    },
+    "required": ["clusters", "stops"],
+}
+TOKENS_PER_CLUSTER = 200
+TOKENS_PER_STOP = 30
+
+
+class MysteryNameStore:
+    # a venue keeps the mystery name it got the first time, across requests and workers
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, place_ids):
+        with self._lock:
+            found = {pid: self._memory[pid] for pid in place_ids if pid in self._memory}
+        missing = [pid for pid in place_ids if pid not in found]
+        if missing and self.collection is not None:
+            try:
+                stored = {doc["_id"]: doc["name"] for doc in self.collection.find({"_id": {"$in": missing}})}
+            except Exception as e:
+                print(f"Error loading mystery names: {str(e)}")
+                stored = {}
+            with self._lock:
+                self._memory.update(stored)
+            found.update(stored)
+        return found
+
+    def set_many(self, names):
+        if not names:
+            return
+        with self._lock:
+            self._memory.update(names)
+        if self.collection is None:
+            return
+        from pymongo import UpdateOne
+
+        try:
+            # first writer wins, a name already handed out to players never changes
+            self.collection.bulk_write([UpdateOne({"_id": pid}, {"$setOnInsert": {"name": name}}, upsert=True)
+                                        for pid, name in names.items()], ordered=False)
+        except Exception as e:
+            print(f"Error saving mystery names: {str(e)}")
+
+
+def valid_route_names(data, cluster_ids, stop_ids):
+    # ({cluster id: (name, description)}, {stop id: mystery name}) for the parts of the reply that fit
+    clusters, stops = {}, {}
+    if not isinstance(data, dict):
+        return clusters, stops
+    for entry in data.get("clusters") or []:
+        if not isinstance(entry, dict) or entry.get("cluster_id") not in cluster_ids:
+            continue
+        name, description = entry.get("cluster_name"), entry.get("cluster_description")
+        if isinstance(name, str) and name.strip() and isinstance(description, str) and description.strip():
+            clusters[entry["cluster_id"]] = (name.strip(), description.strip())
+    for entry in data.get("stops") or []:
+        if not isinstance(entry, dict) or entry.get("stop_id") not in stop_ids:
+            continue
+        if isinstance(entry.get("mystery_name"), str) and entry["mystery_name"].strip():
+            stops[entry["stop_id"]] = entry["mystery_name"].strip()
+    return clusters, stops
+
+
+def name_routes(llm, planned_routes, mystery_names=None):
+    # every cluster and every stop of a route set named by one gemini call, venues that already
+    # have a mystery name keep it and only new ones are asked for
+    place_ids = [place.get("place_id") for _, places in planned_routes for place in places if place.get("place_id")]
+    known = mystery_names.get_many(list(dict.fromkeys(place_ids))) if mystery_names else {}
+
+    stop_ids = {}
+    stop_id_of = {}
+    lines = []
+    for cluster, places in planned_routes:
+        stops = []
+        for place in places:
+            if place.get("place_id") in known:
+                stops.append(f'"{place.get("name", "")}" (mystery name: {known[place["place_id"]]})')
+                continue
+            stop_id = f"s{len(stop_ids) + 1}"
+            stop_ids[stop_id] = place
+            stop_id_of[id(place)] = stop_id
+            stops.append(f'{stop_id}: "{place.get("name", "")}"')
+        lines.append(f"Route {cluster['Cluster ID']}: " + "; ".join(stops))
+
+    routes_text = "\n".join(lines)
+    prompt = f"""These routes make up a city scavenger hunt:
+    {routes_text}
+    For every route give a short evocative cluster_name and a cluster_description of a few sentences that
+    sells the route without naming any stop. For every stop with an id (s1, s2, ...) give a riddle-like
+    mystery_name that never contains the real name. Stops that already have a mystery name keep it."""
+    try:
+        data = json.loads(llm.generate(
+            prompt, kind="route_naming", temperature=0.9, response_schema=ROUTE_NAMES_SCHEMA,
+            max_output_tokens=TOKENS_PER_CLUSTER * len(planned_routes) + TOKENS_PER_STOP * len(stop_ids)))
+    except Exception as e:
+        print(f"Error naming {len(planned_routes)} routes: {str(e)}")
+        data = None
+    cluster_names, stop_names = valid_route_names(data, {c["Cluster ID"] for c, _ in planned_routes}, set(stop_ids))
+
+    for cluster, places in planned_routes:
+        if cluster["Cluster ID"] in cluster_names:
+            cluster["Cluster Name"], cluster["Cluster Description"] = cluster_names[cluster["Cluster ID"]]
+        for leg, place in zip(cluster["Route"], places):
+            name = known.get(place.get("place_id")) or stop_names.get(stop_id_of.get(id(place)))
+            if name:
+                leg["Mystery Name"] = name
+
+    # whatever the structured reply left out is retried per cluster, run together so those calls batch
+    incomplete = [(cluster, places) for cluster, places in planned_routes
+                  if cluster["Cluster ID"] not in cluster_names
+                  or any(leg["Mystery Name"] == "Mystical Place" for leg in cluster["Route"])]
+    if incomplete:
+        with ThreadPoolExecutor(max_workers=len(incomplete)) as executor:
+            list(executor.map(lambda item: name_cluster(llm, *item), incomplete))
+
+    if mystery_names:
+        mystery_names.set_many({place["place_id"]: leg["Mystery Name"]
+                                for cluster, places in planned_routes for leg, place in zip(cluster["Route"], places)
+                                if place.get("place_id") and place["place_id"] not in known
+                                and leg["Mystery Name"] != "Mystical Place"})
+    return planned_routes
+
+
+def name_cluster(llm, cluster, places):
+    stops = ", ".join(place.get("name", "") for place in places)
+    prompt = f"""These stops make up one route of a city scavenger hunt: {stops}.
+    Return only JSON:
+    {{"cluster_name": "[short evocative name for the whole route]",
+      "cluster_description": "[a few sentences that sell the route without naming any stop]",
+      "mystery_names": ["[one riddle-like name per stop, same order, never the real name]", ...]}}"""
+    try:
+        data = llm.generate_json_batched(prompt, kind="naming", temperature=0.9, max_output_tokens=800)
+    except Exception as e:
+        print(f"Error naming cluster {cluster['Cluster ID']}: {str(e)}")
+        llm.fallback("naming")
+        return cluster
+
+    # only fills in what is still a placeholder, names from the structured reply stay
+    if cluster["Cluster Name"] == "Unnamed Cluster":
+        cluster["Cluster Name"] = data.get("cluster_name") or cluster["Cluster Name"]
+    if cluster["Cluster Description"] == "No description available.":
+        cluster["Cluster Description"] = data.get("cluster_description") or cluster["Cluster Description"]
+    for leg, mystery_name in zip(cluster["Route"], data.get("mystery_names") or []):
+        if leg["Mystery Name"] == "Mystical Place":
+            leg["Mystery Name"] = mystery_name or leg["Mystery Name"]
+    return cluster
+
+
+def add_photos(places_client, cluster, places):
+    for leg, image_url in zip(cluster["Route"], places_client.photo_urls(places)):
+        leg["Image URL"] = image_url
+    return cluster
@@ -0,0 +1,223 @@
+import threading
+import time
+from itertools import combinations
+
+import numpy as np
+
+HASH_BITS = 64
+PAGE_SIZE = 1000
+# multi-index hashing: 64-bit hashes split into 4 chunks of 16 bits, anything within radius r of a
+# query matches it on at least one chunk within r // 4 bits, so only those buckets need checking
+MIH_CHUNKS = 4
+MIH_CHUNK_BITS = HASH_BITS // MIH_CHUNKS
+# past this the probes cost more than xor-ing a few hundred thousand hashes
+MIH_MAX_RADIUS = 11
+
+
+def _flip_masks(bits, radius):
+    return [sum(1 << b for b in flipped) for r in range(radius + 1) for flipped in combinations(range(bits), r)]
+
+
+CHUNK_FLIP_MASKS = [_flip_masks(MIH_CHUNK_BITS, r) for r in range(MIH_MAX_RADIUS // MIH_CHUNKS + 1)]
+
+
+def hash_to_int(hash_str):
+    return int(hash_str, 16)
+
+
+def hamming_distances(hash_value, hashes):
+    # one xor + popcount over the whole group instead of hex_to_hash per reference
+    return np.bitwise_count(np.bitwise_xor(hashes, np.uint64(hash_value))).astype(np.int64)
+
+
+class MultiIndexHash:
+    # every reference hash of every location, searchable by hamming radius
+
+    def __init__(self):
+        self._hashes = []
+        self._packed = None
+        self._tables = [{} for _ in range(MIH_CHUNKS)]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, hash_value):
+        position = len(self._hashes)
+        self._hashes.append(hash_value)
+        self._packed = None
+        for chunk, table in enumerate(self._tables):
+            table.setdefault(self._chunk(hash_value, chunk), []).append(position)
+        return position
+
+    def search(self, hash_value, radius):
+        # (positions, distances) of every stored hash within radius
+        if self._packed is None:
+            self._packed = np.array(self._hashes, dtype=np.uint64)
+        if radius > MIH_MAX_RADIUS:
+            distances = hamming_distances(hash_value, self._packed)
+            positions = np.flatnonzero(distances <= radius)
+            return positions, distances[positions]
+
+        candidates = set()
+        masks = CHUNK_FLIP_MASKS[radius // MIH_CHUNKS]
+        for chunk, table in enumerate(self._tables):
+            value = self._chunk(hash_value, chunk)
+            for mask in masks:
+                candidates.update(table.get(value ^ mask, ()))
+        positions = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        distances = hamming_distances(hash_value, self._packed[positions])
+        keep = distances <= radius
+        return positions[keep], distances[keep]
+
+    def _chunk(self, hash_value, chunk):
+        return (hash_value >> (chunk * MIH_CHUNK_BITS)) & ((1 << MIH_CHUNK_BITS) - 1)
+
+
+class PhashIndex:
+    # reference hashes from the supabase checkpoints table, packed as uint64 per location
+
+    def __init__(self, supabase, table="checkpoints", refresh_interval=60):
+        self.supabase = supabase
+        self.table = table
+        self.refresh_interval = refresh_interval
+        self._groups = {}
+        self._lookups = {}
+        self._all = MultiIndexHash()
+        self._all_refs = []
+        self._max_id = None
+        self._ids = set()
+        # add() can run before the first load, so a known max id doesn't mean the table was read
+        self._loaded = False
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        # one refresh at a time, other requests keep matching against what is loaded
+        self._refresh_lock = threading.Lock()
+
+    def load(self):
+        rows = []
+        start = 0
+        while True:
+            page = self.supabase.table(self.table).select('id, location_name, image_hash, image_path') \
+                .order('id').range(start, start + PAGE_SIZE - 1).execute().data
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+        with self._lock:
+            self._groups = {}
+            self._lookups = {}
+            self._all = MultiIndexHash()
+            self._all_refs = []
+            self._max_id = None
+            self._ids = set()
+            self._add_rows(rows)
+            self._loaded = True
+            self._loaded_at = time.monotonic()
+        print(f"[INFO] PhashIndex: loaded {len(rows)} reference hashes for {len(self._groups)} locations")
+
+    def refresh(self):
+        # only rows added since the last load/refresh, e.g. by another worker's /add_sample_image
+        if not self._loaded or self._max_id is None:
+            return self.load()
+        rows = self.supabase.table(self.table).select('id, location_name, image_hash, image_path') \
+            .gt('id', self._max_id).order('id').execute().data
+        with self._lock:
+            self._add_rows(rows)
+            self._loaded_at = time.monotonic()
+
+    def add(self, rows):
+        with self._lock:
+            self._add_rows(rows)
+
+    def match(self, location_name, hash_str):
+        # (distances, reference rows) for every reference of the location, or None if it has none
+        self._refresh_if_stale()
+        with self._lock:
+            groups = [self._packed(key) for key in self._location_keys(location_name)]
+        if not groups:
+            return None
+        hashes = np.concatenate([group[0] for group in groups])
+        rows = [row for group in groups for row in group[1]]
+        return hamming_distances(hash_to_int(hash_str), hashes), rows
+
+    def location_hashes(self, location_name):
+        # every reference hash stored under exactly this location name
+        self._refresh_if_stale()
+        with self._lock:
+            key = location_name.strip().lower()
+            if key not in self._groups:
+                return np.empty(0, dtype=np.uint64)
+            return self._packed(key)[0]
+
+    def identify(self, hash_str, radius, top_k=5):
+        # closest checkpoints across every location, best reference per location
+        self._refresh_if_stale()
+        with self._lock:
+            positions, distances = self._all.search(hash_to_int(hash_str), radius)
+            refs = [self._all_refs[p] for p in positions]
+
+        best = {}
+        for ref, distance in zip(refs, distances.tolist()):
+            if ref["location_name"] not in best or distance < best[ref["location_name"]]["distance"]:
+                best[ref["location_name"]] = {**ref, "distance": distance}
+        return sorted(best.values(), key=lambda c: c["distance"])[:top_k]
+
+    def _stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval
+
+    def _refresh_if_stale(self):
+        if not self._stale():
+            return
+        # nothing to match against before the first load, so only later refreshes are skipped while one runs
+        if not self._refresh_lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            # another thread may have finished a refresh between the check and the lock
+            if self._stale():
+                self.refresh()
+        except Exception as e:
+            print(f"[WARN] PhashIndex: refresh failed, using cached hashes: {e}")
+            self._loaded_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def _location_keys(self, location_name):
+        # case-insensitive substring, like the old ilike('%name%') query
+        name = location_name.strip().lower()
+        keys = self._lookups.get(name)
+        if keys is None:
+            keys = [key for key in self._groups if name in key]
+            self._lookups[name] = keys
+        return keys
+
+    def _packed(self, key):
+        group = self._groups[key]
+        if group["packed"] is None:
+            group["packed"] = np.array(group["hashes"], dtype=np.uint64)
+        return group["packed"], group["refs"]
+
+    def _add_rows(self, rows):
+        for row in rows:
+            hash_str = row.get('image_hash')
+            # a row can arrive twice, from add() and from a refresh that was already in flight
+            if row.get('id') is not None:
+                if row['id'] in self._ids:
+                    continue
+                self._ids.add(row['id'])
+                if self._max_id is None or row['id'] > self._max_id:
+                    self._max_id = row['id']
+            if not hash_str or len(hash_str) * 4 != HASH_BITS or not row.get('location_name'):
+                print(f"[WARN] PhashIndex: skipping reference {row.get('id', 'N/A')} with unusable hash")
+                continue
+            key = row['location_name'].strip().lower()
+            if key not in self._groups:
+                self._groups[key] = {"hashes": [], "refs": [], "packed": None}
+                # a new location can change which names a lookup resolves to
+                self._lookups = {}
+            group = self._groups[key]
+            group["hashes"].append(hash_to_int(hash_str))
+            group["refs"].append({"image_hash": hash_str, "image_path": row.get('image_path')})
+            group["packed"] = None
+            self._all.add(hash_to_int(hash_str))
+            self._all_refs.append({"location_name": row['location_name'].strip(), "image_hash": hash_str,
+                                   "image_path": row.get('image_path')})
@@ -0,0 +1,150 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+SEARCH_KIND = "search"
+DETAILS_KIND = "details"
+PHOTO_KIND = "photo"
+
+
+class SQLitePlaceStore:
+    # one connection per thread, sqlite handles the cross-thread/process locking
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS place_cache ("
+            "kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (kind, key))")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, kind, key, max_age):
+        row = self._conn().execute(
+            "SELECT value FROM place_cache WHERE kind = ? AND key = ? AND created_at >= ?",
+            (kind, key, time.time() - max_age)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, kind, key, value):
+        self.set_many(kind, {key: value})
+
+    def get_many(self, kind, keys, max_age):
+        found = {}
+        keys = list(keys)
+        # stay under sqlite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self._conn().execute(
+                f"SELECT key, value FROM place_cache WHERE kind = ? AND created_at >= ? "
+                f"AND key IN ({','.join('?' * len(chunk))})",
+                (kind, time.time() - max_age, *chunk)).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def set_many(self, kind, values):
+        conn = self._conn()
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO place_cache (kind, key, value, created_at) VALUES (?, ?, ?, ?)",
+            [(kind, key, json.dumps(value), now) for key, value in values.items()])
+        conn.commit()
+
+
+class MongoPlaceStore:
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self, expire_after):
+        self.collection.create_index("created_at", expireAfterSeconds=expire_after)
+
+    def get(self, kind, key, max_age):
+        doc = self.collection.find_one({
+            "_id": f"{kind}:{key}",
+            "created_at": {"$gte": datetime.utcnow() - timedelta(seconds=max_age)}})
+        return doc["value"] if doc else None
+
+    def set(self, kind, key, value):
+        self.collection.replace_one(
+            {"_id": f"{kind}:{key}"},
+            {"_id": f"{kind}:{key}", "value": value, "created_at": datetime.utcnow()},
+            upsert=True)
+
+    def get_many(self, kind, keys, max_age):
+        prefix = f"{kind}:"
+        docs = self.collection.find({
+            "_id": {"$in": [prefix + key for key in keys]},
+            "created_at": {"$gte": datetime.utcnow() - timedelta(seconds=max_age)}})
+        return {doc["_id"][len(prefix):]: doc["value"] for doc in docs}
+
+    def set_many(self, kind, values):
+        if not values:
+            return
+        from pymongo import ReplaceOne
+
+        now = datetime.utcnow()
+        self.collection.bulk_write([
+            ReplaceOne({"_id": f"{kind}:{key}"}, {"_id": f"{kind}:{key}", "value": value, "created_at": now}, upsert=True)
+            for key, value in values.items()], ordered=False)
+
+
+class PlaceCache:
+    # nearby results per (geohash cell, keyword) and details per place_id, each with its own ttl
+
+    def __init__(self, store, search_ttl=24 * 3600, details_ttl=7 * 24 * 3600):
+        self.store = store
+        self.search_ttl = search_ttl
+        self.details_ttl = details_ttl
+
+    def get_searches(self, cells, keyword):
+        # {cell: entry} for every cell of one keyword search that is still fresh
+        keys = {f"{cell}|{keyword or ''}": cell for cell in cells}
+        try:
+            found = self.store.get_many(SEARCH_KIND, list(keys), self.search_ttl)
+        except Exception as e:
+            print(f"Place cache read failed for {keyword} searches: {str(e)}")
+            return {}
+        return {keys[key]: entry for key, entry in found.items()}
+
+    def set_searches(self, keyword, entries):
+        try:
+            self.store.set_many(SEARCH_KIND, {f"{cell}|{keyword or ''}": entry for cell, entry in entries.items()})
+        except Exception as e:
+            print(f"Place cache write failed for {keyword} searches: {str(e)}")
+
+    def get_details(self, place_id):
+        return self._get(DETAILS_KIND, place_id, self.details_ttl)
+
+    def set_details(self, place_id, details):
+        self._set(DETAILS_KIND, place_id, details)
+
+    def get_photo(self, place_id):
+        return self._get(PHOTO_KIND, place_id, self.details_ttl)
+
+    def set_photo(self, place_id, url):
+        self._set(PHOTO_KIND, place_id, url)
+
+    def _get(self, kind, key, max_age):
+        try:
+            return self.store.get(kind, key, max_age)
+        except Exception as e:
+            print(f"Place cache read failed for {kind}:{key}: {str(e)}")
+            return None
+
+    def _set(self, kind, key, value):
+        try:
+            self.store.set(kind, key, value)
+        except Exception as e:
+            print(f"Place cache write failed for {kind}:{key}: {str(e)}")
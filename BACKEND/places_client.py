@@ -0,0 +1,194 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from geo import haversine_km, geohash_bits, geohash_cells_covering, cell_circle, cell_key, parse_cell_key
+
+NEARBY_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+DETAILS_URL = "https://maps.googleapis.com/maps/api/place/details/json"
+PHOTO_URL = "https://maps.googleapis.com/maps/api/place/photo"
+PHOTO_MAX_WIDTH = 400
+DETAIL_FIELDS = "place_id,name,geometry,rating,user_ratings_total,wheelchair_accessible_entrance,photos,url,types,vicinity"
+METERS_PER_MILE = 1609.34
+MAX_RADIUS_METERS = 50000
+# google needs a moment before a next_page_token becomes valid
+NEXT_PAGE_DELAY = 2
+RETRY_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+# only answers google actually gave are worth caching, an outage must not look like an empty area
+CACHEABLE_STATUSES = {"OK", "ZERO_RESULTS"}
+
+
+def radius_in_meters(radius_miles):
+    return min(int(float(radius_miles) * METERS_PER_MILE), MAX_RADIUS_METERS)
+
+
+def place_location(place):
+    location = place.get("geometry", {}).get("location", {})
+    return location.get("lat"), location.get("lng")
+
+
+def search_covers(entry, cell, lat, lon, radius_km):
+    # a cell entry answers a query when the search that filled it covered the query circle or the
+    # whole cell, plain lists are from per-cell searches and always cover their cell
+    if isinstance(entry, list):
+        return True
+    entry_lat, entry_lon, entry_radius_km = entry["circle"]
+    if haversine_km(entry_lat, entry_lon, lat, lon) + radius_km <= entry_radius_km + 1e-6:
+        return True
+    cell_lat, cell_lon, cell_radius_km = cell_circle(cell)
+    return haversine_km(entry_lat, entry_lon, cell_lat, cell_lon) + cell_radius_km <= entry_radius_km
+
+
+class PlacesClient:
+    # every keyword search and every details lookup goes out at once, over one pooled session
+
+    def __init__(self, api_key, max_concurrency=8, timeout=5, retries=3, backoff=0.25, cache=None):
+        self.api_key = api_key
+        self.cache = cache
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="places")
+
+    def nearby_places_multi_keyword(self, base_keywords, maxresult, lat, lon, radius):
+        keywords = base_keywords or [None]
+        if self.cache is None:
+            results = self.executor.map(
+                lambda keyword: self.nearby_places(keyword, maxresult, lat, lon, radius_in_meters(radius))[0], keywords)
+        else:
+            results = self._cached_nearby_places(keywords, maxresult, lat, lon, radius)
+
+        # the same venue usually shows up under several keywords, only keep it once
+        places = {}
+        for keyword_places in results:
+            for place in keyword_places:
+                if place.get("place_id") and place["place_id"] not in places:
+                    places[place["place_id"]] = place
+        return list(places.values())
+
+    def _cached_nearby_places(self, keywords, maxresult, lat, lon, radius):
+        radius_km = radius_in_meters(radius) / 1000
+        cells = geohash_cells_covering(lat, lon, radius_km)
+        return list(self.executor.map(
+            lambda keyword: self._keyword_places(keyword, cells, maxresult, lat, lon, radius_km), keywords))
+
+    def _keyword_places(self, keyword, cells, maxresult, lat, lon, radius_km):
+        cell_places = {cell: entry if isinstance(entry, list) else entry["places"]
+                       for cell, entry in self.cache.get_searches(cells, keyword).items()
+                       if search_covers(entry, cell, lat, lon, radius_km)}
+        missing = [cell for cell in cells if cell not in cell_places]
+        if missing:
+            # one search for the query circle however many cells it left uncovered, the old code
+            # spent one call here too and per-cell searches would multiply it
+            places, complete = self.nearby_places(
+                keyword, maxresult, lat, lon, min(int(radius_km * 1000), MAX_RADIUS_METERS))
+            bits = parse_cell_key(cells[0])[1]
+            found = {cell: [] for cell in missing}
+            for place in places:
+                place_lat, place_lng = place_location(place)
+                if place_lat is not None:
+                    cell = cell_key(geohash_bits(place_lat, place_lng, bits), bits)
+                    if cell in found:
+                        found[cell].append(place)
+            cell_places.update(found)
+            if complete:
+                # the circle goes with each cell so only queries it covers reuse the entry
+                self.cache.set_searches(keyword, {cell: {"circle": [lat, lon, radius_km], "places": places_in_cell}
+                                                  for cell, places_in_cell in found.items()})
+
+        merged = {}
+        for places in cell_places.values():
+            for place in places:
+                place_lat, place_lng = place_location(place)
+                if place_lat is not None and haversine_km(lat, lon, place_lat, place_lng) <= radius_km:
+                    merged.setdefault(place.get("place_id"), place)
+        # cells lose google's prominence order, review count is the closest thing we have
+        ranked = sorted(merged.values(), key=lambda p: p.get("user_ratings_total", 0), reverse=True)
+        return ranked[:maxresult]
+
+    def nearby_places(self, keyword, maxresult, lat, lon, radius_m):
+        # (places, complete), complete is False when any page failed so a partial or empty
+        # result from an outage is never mistaken for "nothing here"
+        params = {"location": f"{lat},{lon}", "radius": radius_m, "key": self.api_key}
+        if keyword:
+            params["keyword"] = keyword
+
+        places = []
+        while len(places) < maxresult:
+            data = self._get(NEARBY_URL, params)
+            if not data or data.get("status") not in CACHEABLE_STATUSES:
+                status = data.get("status") if data else "no response"
+                print(f"Nearby search failed for {keyword}: {status}")
+                return places[:maxresult], False
+            places.extend(data.get("results", []))
+            token = data.get("next_page_token")
+            if not token:
+                break
+            time.sleep(NEXT_PAGE_DELAY)
+            params = {"pagetoken": token, "key": self.api_key}
+        return places[:maxresult], True
+
+    def place_details(self, place_id):
+        if self.cache is not None:
+            details = self.cache.get_details(place_id)
+            if details is not None:
+                return details
+        data = self._get(DETAILS_URL, {"place_id": place_id, "fields": DETAIL_FIELDS, "key": self.api_key})
+        details = data.get("result") if data else None
+        if details and self.cache is not None:
+            self.cache.set_details(place_id, details)
+        return details
+
+    def sorted_place_details(self, places, accessible=False):
+        place_ids = list(dict.fromkeys(place["place_id"] for place in places if place.get("place_id")))
+        details = [d for d in self.executor.map(self.place_details, place_ids) if d]
+        if accessible:
+            details = [d for d in details if d.get("wheelchair_accessible_entrance")]
+        details.sort(key=lambda d: (d.get("rating", 0), d.get("user_ratings_total", 0)), reverse=True)
+        return details
+
+    def photo_url(self, place):
+        # the photo endpoint redirects to a keyless googleusercontent url, that's what clients get
+        photos = place.get("photos") or []
+        if not photos:
+            return None
+        place_id = place.get("place_id")
+        if self.cache is not None and place_id:
+            url = self.cache.get_photo(place_id)
+            if url is not None:
+                return url
+        params = {"maxwidth": PHOTO_MAX_WIDTH, "photo_reference": photos[0].get("photo_reference"), "key": self.api_key}
+        try:
+            response = self.session.get(PHOTO_URL, params=params, timeout=self.timeout, allow_redirects=False)
+            url = response.headers.get("Location")
+        except requests.RequestException as e:
+            print(f"Photo lookup failed for {place_id}: {str(e)}")
+            return None
+        if url and self.cache is not None and place_id:
+            self.cache.set_photo(place_id, url)
+        return url
+
+    def photo_urls(self, places):
+        return list(self.executor.map(self.photo_url, places))
+
+    def _get(self, url, params):
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code < 500 and response.status_code != 429:
+                    data = response.json()
+                    if data.get("status") not in RETRY_STATUSES:
+                        return data
+            except (requests.RequestException, ValueError) as e:
+                print(f"Places request failed (attempt {attempt + 1}): {str(e)}")
+
+            if attempt < self.retries:
+                # full jitter so a burst of retries doesn't land on google all at once
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        return None
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+
+from geo import (haversine_km, initial_bearing, compass_point, geohash_bits, geohash_cells_covering, bits_for_radius,
+                 cell_key, KM_PER_DEGREE_LAT)
+
+ARRIVAL_RADIUS_M = 75
+# a phone that only knows where it is to within a few hundred meters can't prove it arrived,
+# so reported accuracy widens the arrival circle by at most this much
+MAX_ACCURACY_ALLOWANCE_M = 50
+# the old tolerance was in degrees of latitude
+METERS_PER_DEGREE = KM_PER_DEGREE_LAT * 1000
+
+
+def tolerance_to_meters(tolerance):
+    return float(tolerance) * METERS_PER_DEGREE
+
+
+def arrival_check(lat, lng, target_lat, target_lng, radius_m=ARRIVAL_RADIUS_M, accuracy_m=None):
+    distance_m = haversine_km(lat, lng, target_lat, target_lng) * 1000
+    allowance = min(accuracy_m or 0, MAX_ACCURACY_ALLOWANCE_M)
+    bearing = initial_bearing(lat, lng, target_lat, target_lng)
+    return {
+        "is_at_location": distance_m <= radius_m + allowance,
+        "distance_m": round(distance_m, 1),
+        "bearing_deg": round(bearing, 1),
+        "direction": compass_point(bearing),
+    }
+
+
+def route_checkpoints(route):
+    # [(lat, lng, name)] from a stored cluster, every leg's destination is one stop
+    checkpoints = []
+    for leg in route.get("Route", []):
+        lat, lng = (float(v) for v in leg["Destination"].split(","))
+        checkpoints.append((lat, lng, leg.get("Mystery Name") or leg.get("Name")))
+    return checkpoints
+
+
+class RouteIndex:
+    # one route's stops bucketed by geohash cell, a check only looks at stops in the cells around the user
+
+    def __init__(self, checkpoints, radius_m=ARRIVAL_RADIUS_M):
+        self.checkpoints = checkpoints
+        self.radius_m = radius_m
+        reach_km = (radius_m + MAX_ACCURACY_ALLOWANCE_M) / 1000
+        center_lat = sum(c[0] for c in checkpoints) / len(checkpoints) if checkpoints else 0.0
+        self.bits = bits_for_radius(center_lat, reach_km)
+        self.reach_km = reach_km
+        self.cells = {}
+        for i, (lat, lng, _) in enumerate(checkpoints):
+            self.cells.setdefault(cell_key(geohash_bits(lat, lng, self.bits), self.bits), []).append(i)
+
+    def check(self, lat, lng, accuracy_m=None, next_index=0):
+        # which stops the user is at, plus where the next one is
+        arrived = []
+        for key in geohash_cells_covering(lat, lng, self.reach_km, self.bits):
+            for i in self.cells.get(key, ()):
+                target_lat, target_lng, name = self.checkpoints[i]
+                result = arrival_check(lat, lng, target_lat, target_lng, self.radius_m, accuracy_m)
+                if result["is_at_location"]:
+                    arrived.append({"index": i, "name": name, "distance_m": result["distance_m"]})
+        arrived.sort(key=lambda a: a["distance_m"])
+
+        next_stop = None
+        if 0 <= next_index < len(self.checkpoints):
+            target_lat, target_lng, name = self.checkpoints[next_index]
+            next_stop = {"index": next_index, "name": name,
+                         **arrival_check(lat, lng, target_lat, target_lng, self.radius_m, accuracy_m)}
+        return {
+            "is_at_location": next_stop["is_at_location"] if next_stop else bool(arrived),
+            "arrived_at": arrived,
+            "next_stop": next_stop,
+        }
+
+
+class RouteIndexCache:
+    # built once per stored route and reused by every poll from every player on it
+
+    def __init__(self, max_entries=1024, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, load, radius_m=ARRIVAL_RADIUS_M):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+        checkpoints = load()
+        if checkpoints is None:
+            return None
+        index = RouteIndex(checkpoints, radius_m)
+        with self._lock:
+            self._entries[key] = (index, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
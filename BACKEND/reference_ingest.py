@@ -0,0 +1,32 @@
+import numpy as np
+
+from phash_index import hamming_distances, hash_to_int
+
+# photos this close to a reference already stored for the same checkpoint add nothing to matching
+DUPLICATE_DISTANCE = 4
+INSERT_BATCH_SIZE = 500
+
+
+def dedupe_references(rows, phash_index, max_distance=DUPLICATE_DISTANCE):
+    # (kept, duplicates), compared against stored references and earlier rows of the same location
+    seen = {}
+    kept, duplicates = [], []
+    for row in rows:
+        key = row["location_name"].strip().lower()
+        if key not in seen:
+            seen[key] = phash_index.location_hashes(key)
+        value = hash_to_int(row["image_hash"])
+        if len(seen[key]) and hamming_distances(value, seen[key]).min() <= max_distance:
+            duplicates.append(row)
+            continue
+        seen[key] = np.append(seen[key], np.uint64(value))
+        kept.append(row)
+    return kept, duplicates
+
+
+def insert_references(supabase, table, rows, batch_size=INSERT_BATCH_SIZE):
+    # one insert per batch instead of one round trip per photo, returns the stored rows
+    inserted = []
+    for i in range(0, len(rows), batch_size):
+        inserted.extend(supabase.table(table).insert(rows[i:i + batch_size]).execute().data)
+    return inserted
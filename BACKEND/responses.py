@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MIMETYPE = "application/json"
+# below this the headers cost more than compression saves
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSED_CACHE_SIZE = 256
+
+
+def dumps(obj):
+    # bytes, ObjectIds and datetimes come out as strings like jsonify(default=str) did
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=str, separators=(",", ":")).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # jsonify through orjson when it is installed, falls back to the stdlib provider otherwise
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def json_response(obj=None, raw=None, status=200, etag=False):
+    # raw is already serialized json and is sent as is, no parse and dump round trip
+    body = raw if raw is not None else dumps(obj)
+    if isinstance(body, str):
+        body = body.encode()
+    response = Response(body, status=status, mimetype=JSON_MIMETYPE)
+    if etag:
+        # strong etag over the exact bytes, the compressor gives each encoding its own tag
+        response.set_etag(hashlib.blake2b(body, digest_size=16).hexdigest())
+    return response
+
+
+class ResponseCompressor:
+    # br or gzip by accept-encoding, bodies with an etag are compressed once and reused
+
+    def __init__(self, max_entries=COMPRESSED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, response, request):
+        encoding = self._encoding(request.headers.get("Accept-Encoding", ""))
+        if (encoding is None or response.direct_passthrough or response.is_streamed or response.status_code != 200
+                or "Content-Encoding" in response.headers or response.mimetype != JSON_MIMETYPE):
+            return self._conditional(response, request)
+        response.vary.add("Accept-Encoding")
+        body = response.get_data()
+        if len(body) < MIN_COMPRESS_BYTES:
+            return self._conditional(response, request)
+
+        etag, weak = response.get_etag()
+        compressed = self._cached(etag, encoding) if etag else None
+        if compressed is None:
+            compressed = self._compress(body, encoding)
+            if etag:
+                self._remember(etag, encoding, compressed)
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return self._conditional(response, request)
+
+    def _conditional(self, response, request):
+        # only responses that carry an etag can be answered with a 304
+        if response.status_code != 200 or response.is_streamed or "ETag" not in response.headers:
+            return response
+        if request.method in ("GET", "HEAD"):
+            return response.make_conditional(request)
+        # werkzeug only does GET/HEAD, read-only POST lookups like /get_data_from_parameters that
+        # opted into an etag are matched against If-None-Match here
+        etag, _ = response.get_etag()
+        if not request.if_none_match.contains_weak(etag):
+            return response
+        not_modified = Response(status=304)
+        for header in ("ETag", "Vary", "Cache-Control"):
+            if header in response.headers:
+                not_modified.headers[header] = response.headers[header]
+        return not_modified
+
+    def _encoding(self, accept_encoding):
+        accepted = set()
+        for part in accept_encoding.lower().split(","):
+            name, _, params = part.partition(";")
+            # "gzip;q=0" means the client refuses gzip
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(name.strip())
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=BROTLI_QUALITY)
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+    def _cached(self, etag, encoding):
+        with self._lock:
+            compressed = self._cache.get((etag, encoding))
+            if compressed is not None:
+                self._cache.move_to_end((etag, encoding))
+            return compressed
+
+    def _remember(self, etag, encoding, compressed):
+        with self._lock:
+            self._cache[(etag, encoding)] = compressed
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
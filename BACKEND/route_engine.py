@@ -0,0 +1,192 @@
+import numpy as np
+
+from geo import EARTH_RADIUS_KM, KM_PER_DEGREE_LAT
+from travel_matrix import TRAVEL_MODES, ESTIMATE_SPEED_KMH, ESTIMATE_DETOUR, estimate_leg
+
+KMEANS_ITERATIONS = 25
+# google maps links only know these travel modes
+MAPS_TRAVEL_MODES = {"DRIVE": "driving", "WALK": "walking", "BICYCLE": "bicycling", "TRANSIT": "transit"}
+
+
+def haversine_matrix(lats, lngs):
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lng = np.radians(np.asarray(lngs, dtype=np.float64))
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def estimated_minutes(distance_km, modes):
+    # fastest of the user's modes for every pair, good enough to decide the order of stops
+    per_mode = [distance_km * ESTIMATE_DETOUR[TRAVEL_MODES.get(m, "DRIVE")] / ESTIMATE_SPEED_KMH[TRAVEL_MODES.get(m, "DRIVE")] * 60
+                for m in modes]
+    return np.min(per_mode, axis=0)
+
+
+def kmeans_pp(points, k, rng, iterations=KMEANS_ITERATIONS):
+    n = len(points)
+    # co-located venues are common, never ask for more clusters than there are distinct spots
+    k = min(k, len(np.unique(points, axis=0)))
+    centers = np.empty((k, points.shape[1]))
+    centers[0] = points[rng.integers(n)]
+    closest = np.sum((points - centers[0]) ** 2, axis=1)
+    for c in range(1, k):
+        total = closest.sum()
+        idx = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centers[c] = points[idx]
+        closest = np.minimum(closest, np.sum((points - centers[c]) ** 2, axis=1))
+
+    labels = np.zeros(n, dtype=np.int64)
+    for _ in range(iterations):
+        dist = np.sum((points[:, None, :] - centers[None, :, :]) ** 2, axis=2)
+        new_labels = np.argmin(dist, axis=1)
+        counts = np.bincount(new_labels, minlength=k)
+        # reseed every empty cluster on its own far point, taken from clusters that can spare one
+        by_distance = np.argsort(-dist[np.arange(n), new_labels])
+        candidates = iter(by_distance)
+        for c in np.flatnonzero(counts == 0):
+            for far in candidates:
+                if counts[new_labels[far]] > 1:
+                    counts[new_labels[far]] -= 1
+                    new_labels[far] = c
+                    counts[c] = 1
+                    break
+        sums = np.zeros_like(centers)
+        np.add.at(sums, new_labels, points)
+        # a cluster that is still empty keeps its previous center
+        filled = counts > 0
+        centers[filled] = sums[filled] / counts[filled][:, None]
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return labels
+
+
+def nearest_neighbor_path(cost, nodes):
+    # open path from node 0 (the start) through every node in nodes
+    path = [0]
+    remaining = np.asarray(nodes)
+    while len(remaining):
+        nxt = np.argmin(cost[path[-1], remaining])
+        path.append(int(remaining[nxt]))
+        remaining = np.delete(remaining, nxt)
+    return np.asarray(path)
+
+
+def two_opt(path, cost, max_passes=50):
+    # reverse path[i..j] while it shortens the open path, the start stays fixed
+    path = path.copy()
+    n = len(path)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            j = np.arange(i + 1, n)
+            a, b = path[i - 1], path[i]
+            c = path[j]
+            d = np.append(path[j[:-1] + 1], -1)
+            has_next = d >= 0
+            before = cost[a, b] + np.where(has_next, cost[c, np.maximum(d, 0)], 0.0)
+            after = cost[a, c] + np.where(has_next, cost[b, np.maximum(d, 0)], 0.0)
+            delta = after - before
+            best = np.argmin(delta)
+            if delta[best] < -1e-9:
+                path[i:j[best] + 1] = path[i:j[best] + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return path
+
+
+def trim_to_budget(path, cost, visit_duration, time_limit):
+    # keep the longest prefix of stops that fits travel plus time spent at each stop
+    if len(path) < 2:
+        return path
+    leg_minutes = cost[path[:-1], path[1:]] + visit_duration
+    fits = np.cumsum(leg_minutes) <= time_limit
+    if fits.all():
+        return path
+    return path[:1 + int(np.argmin(fits))]
+
+
+def plan_clusters(lat, lng, places, max_groups, time_limit, visit_duration_per_location, user_modes, seed=0):
+    # returns one ordered list of place indices per cluster, the start point is not included
+    if not places:
+        return []
+    lats = np.array([lat] + [p["geometry"]["location"]["lat"] for p in places])
+    lngs = np.array([lng] + [p["geometry"]["location"]["lng"] for p in places])
+    cost = estimated_minutes(haversine_matrix(lats, lngs), user_modes)
+
+    # flat projection around the start is plenty for clustering inside one search radius
+    points = np.column_stack([(lats[1:] - lat) * KM_PER_DEGREE_LAT,
+                              (lngs[1:] - lng) * KM_PER_DEGREE_LAT * np.cos(np.radians(lat))])
+    labels = kmeans_pp(points, max_groups, np.random.default_rng(seed))
+
+    clusters = []
+    for c in range(labels.max() + 1):
+        nodes = np.flatnonzero(labels == c) + 1
+        if not len(nodes):
+            continue
+        path = two_opt(nearest_neighbor_path(cost, nodes), cost)
+        path = trim_to_budget(path, cost, visit_duration_per_location, time_limit)
+        if len(path) > 1:
+            clusters.append([int(i) - 1 for i in path[1:]])
+    return clusters
+
+
+def plan_routes(lat, lng, places, time_limit, max_groups, visit_duration_per_location, user_modes,
+                travel_matrix=None, seed=0):
+    # same cluster/leg shape as the stored outputs, names and images are filled in afterwards
+    modes = user_modes or ["driving"]
+    clusters = plan_clusters(lat, lng, places, max_groups, time_limit, visit_duration_per_location, modes, seed)
+
+    start = (lat, lng)
+    paths = [[start] + [_point(places[i]) for i in stops] for stops in clusters]
+    if travel_matrix:
+        legs_by_mode = travel_matrix.route_legs(paths, modes)
+    else:
+        legs_by_mode = {mode: {pair: estimate_leg(pair[0], pair[1], mode) for path in paths
+                               for pair in zip(path[:-1], path[1:])} for mode in modes}
+
+    routes = []
+    for cluster_id, (stops, points) in enumerate(zip(clusters, paths)):
+        ordered = [places[i] for i in stops]
+        route = []
+        for origin, destination, place in zip(points[:-1], points[1:], ordered):
+            mode = min(modes, key=lambda m: legs_by_mode[m][(origin, destination)]["minutes"])
+            leg = legs_by_mode[mode][(origin, destination)]
+            maps_mode = MAPS_TRAVEL_MODES[TRAVEL_MODES.get(mode, "DRIVE")]
+            route.append({
+                "Destination": f"{destination[0]},{destination[1]}",
+                "Estimated Travel Distance (km)": leg["km"],
+                "Estimated Travel Time (min)": leg["minutes"],
+                "Google Maps Link": f"https://www.google.com/maps/dir/{origin[0]},{origin[1]}/{destination[0]},{destination[1]}/?travelmode={maps_mode}",
+                "Image URL": None,
+                "Mode of Transport": mode,
+                "Mystery Name": "Mystical Place",
+                "Name": place.get("name", ""),
+                "Origin": f"{origin[0]},{origin[1]}",
+            })
+
+        # real leg times can come back slower than the estimates the order was planned on
+        while len(route) > 1 and sum(leg["Estimated Travel Time (min)"] + visit_duration_per_location
+                                     for leg in route) > time_limit:
+            route.pop()
+            ordered.pop()
+
+        routes.append(({
+            "Cluster Description": "No description available.",
+            "Cluster ID": cluster_id,
+            "Cluster Name": "Unnamed Cluster",
+            "Estimated Travel Distance (km)": round(sum(leg["Estimated Travel Distance (km)"] for leg in route), 1),
+            "Estimated Travel Time (min)": round(sum(leg["Estimated Travel Time (min)"] for leg in route), 1),
+            "Popularity": int(round(np.mean([p.get("user_ratings_total", 0) for p in ordered]))),
+            "Ratings": round(float(np.mean([p.get("rating", 0) for p in ordered])), 1),
+            "Route": route,
+        }, ordered))
+    return routes
+
+
+def _point(place):
+    location = place["geometry"]["location"]
+    return location["lat"], location["lng"]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the backend is a flat folder of modules, run with: python -m pytest BACKEND/tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
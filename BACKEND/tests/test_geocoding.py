@@ -0,0 +1,15 @@
+from geocoding import canonical_address
+
+
+def test_street_spellings_share_a_key():
+    assert canonical_address("164 East 87th Street") == canonical_address("164 E. 87th St.") == "164 e 87th st"
+
+
+def test_units_and_country_are_dropped():
+    assert canonical_address("350 Fifth Avenue, Suite 200, New York, NY, USA") == "350 fifth ave new york ny"
+    assert canonical_address("12 Main St Apt 4B") == canonical_address("12 main street #4b") == "12 main st"
+
+
+def test_florida_is_not_a_floor():
+    assert canonical_address("100 Ocean Dr, Miami, FL") == "100 ocean dr miami fl"
+    assert canonical_address(None) == ""
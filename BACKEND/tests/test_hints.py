@@ -0,0 +1,41 @@
+from hints import FINAL_HINT_ID, MAX_HINT_STEPS, next_hint, validate_hint_tree
+
+TREE = {"tree": {
+    "1": {"text": "first", "type": "symbolic", "on_understood": "2A", "on_confused": "2B"},
+    "2A": {"text": "deeper", "type": "historical", "on_understood": "final", "on_confused": "final"},
+    "2B": {"text": "simpler", "type": "factual", "on_understood": "final", "on_confused": "2A"},
+}}
+
+
+def tree_with(**nodes):
+    return {"tree": {**TREE["tree"], **nodes}}
+
+
+def test_valid_tree():
+    assert validate_hint_tree(TREE)
+
+
+def test_rejects_broken_trees():
+    assert not validate_hint_tree(None)
+    assert not validate_hint_tree({"tree": {"2A": TREE["tree"]["2A"]}})
+    assert not validate_hint_tree(tree_with(**{"2A": {"text": "", "on_understood": "final"}}))
+    assert not validate_hint_tree(tree_with(**{"2A": {"text": "deeper", "on_understood": "9"}}))
+    # 2A -> 2B -> 2A never reaches final
+    assert not validate_hint_tree(tree_with(**{"2A": {"text": "deeper", "on_understood": "2B", "on_confused": "2B"}}))
+
+
+def test_next_hint_walks_the_tree():
+    assert next_hint(TREE, "The Met")["hint"]["id"] == "1"
+    assert next_hint(TREE, "The Met", "1", "understood")["hint"]["id"] == "2A"
+    assert next_hint(TREE, "The Met", "1", "confused")["hint"]["id"] == "2B"
+    step = next_hint(TREE, "The Met", "2B", "confused", reject_count=1)
+    assert step == {"hint": {"id": "2A", **TREE["tree"]["2A"]}, "is_final": False}
+
+
+def test_next_hint_ends_in_the_answer():
+    for step in (next_hint(TREE, "The Met", "2A", "understood"),
+                 next_hint(TREE, "The Met", FINAL_HINT_ID),
+                 next_hint(TREE, "The Met", "1", "confused", reject_count=MAX_HINT_STEPS),
+                 next_hint(TREE, "The Met", "unknown", "understood")):
+        assert step["is_final"]
+        assert step["hint"]["text"] == "The answer is The Met."
@@ -0,0 +1,44 @@
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from image_hashing import ImageTooLarge, InvalidImage, decode_base64_image, hash_image_bytes
+
+
+def jpeg_bytes(size=(64, 48)):
+    buffer = BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def test_decodes_plain_data_url_and_wrapped_base64():
+    data = jpeg_bytes()
+    encoded = base64.b64encode(data).decode()
+    assert decode_base64_image(encoded) == data
+    assert decode_base64_image("data:image/jpeg;base64," + encoded) == data
+    wrapped = "\n".join(encoded[i:i + 76] for i in range(0, len(encoded), 76))
+    assert decode_base64_image(wrapped) == data
+
+
+@pytest.mark.parametrize("value", ["@@@", "abc", "aGVsbG8=!!", 12])
+def test_malformed_base64_is_invalid(value):
+    with pytest.raises(InvalidImage):
+        decode_base64_image(value)
+
+
+def test_oversized_base64_is_never_decoded():
+    with pytest.raises(ImageTooLarge):
+        decode_base64_image("A" * 1000, max_bytes=100)
+
+
+def test_bytes_that_are_not_an_image_are_invalid():
+    with pytest.raises(InvalidImage):
+        hash_image_bytes(b"hello, not an image")
+    with pytest.raises(InvalidImage):
+        hash_image_bytes(jpeg_bytes()[:200])
+
+
+def test_real_image_hashes():
+    assert set(hash_image_bytes(jpeg_bytes())) == {"phash", "dhash", "whash"}
@@ -0,0 +1,54 @@
+import json
+import subprocess
+import sys
+import time
+
+from jobs import DONE, RUNNING, JobQueue
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def insert_running(queue, job_id, fingerprint, pid, heartbeat):
+    queue._conn().execute(
+        "INSERT INTO jobs (id, fingerprint, status, params, worker, pid, heartbeat, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (job_id, fingerprint, RUNNING, json.dumps({"n": 1}), "gone-worker", pid, heartbeat, heartbeat, heartbeat))
+
+
+def make_queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), lambda params: {"n": params["n"] + 1}, max_workers=1)
+
+
+def test_job_of_an_exited_worker_is_rerun(tmp_path):
+    queue = make_queue(tmp_path)
+    # heartbeat is fresh, the process is what's missing
+    insert_running(queue, "orphan", "fp", dead_pid(), time.time())
+    queue.requeue_orphans()
+    assert queue.wait("orphan", 5) == {"job_id": "orphan", "status": DONE, "result": {"n": 2}}
+
+
+def test_job_with_a_stale_heartbeat_is_rerun(tmp_path):
+    queue = make_queue(tmp_path)
+    insert_running(queue, "stuck", "fp", None, time.time() - queue.stale_after - 1)
+    queue.requeue_orphans()
+    assert queue.wait("stuck", 5)["status"] == DONE
+
+
+def test_live_job_is_left_alone_and_shared(tmp_path):
+    queue = make_queue(tmp_path)
+    insert_running(queue, "live", "fp", None, time.time())
+    queue.requeue_orphans()
+    assert queue.get("live")["status"] == RUNNING
+    assert queue.submit({"n": 1}, "fp") == "live"
+
+
+def test_submit_does_not_join_an_orphaned_job(tmp_path):
+    queue = make_queue(tmp_path)
+    insert_running(queue, "orphan", "fp", dead_pid(), time.time())
+    job_id = queue.submit({"n": 5}, "fp")
+    assert job_id != "orphan"
+    assert queue.wait(job_id, 5)["result"] == {"n": 6}
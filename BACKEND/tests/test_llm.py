@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from hints import generate_hint_tree
+from llm import GeminiManager
+
+
+class FakeModels:
+    def __init__(self, fail_first=0):
+        self.fail_first = fail_first
+        self.calls = 0
+
+    def generate_content(self, model, contents, config):
+        self.calls += 1
+        if self.calls <= self.fail_first:
+            raise RuntimeError("gemini is down")
+        return SimpleNamespace(text='{"tree": {"1": {"text": "a hint", "on_understood": "final"}}}',
+                               usage_metadata=None)
+
+
+def make_manager(fail_first):
+    return GeminiManager(SimpleNamespace(models=FakeModels(fail_first)), batch_window=0)
+
+
+def test_fallback_rate_counts_failed_requests():
+    llm = make_manager(fail_first=10)
+    for i in range(5):
+        generate_hint_tree(llm, f"Place {i}")
+    stats = llm.metrics()["hint_tree"]
+    assert (stats["requests"], stats["errors"], stats["fallbacks"]) == (5, 5, 5)
+    assert stats["fallback_rate"] == 1.0
+
+
+def test_fallback_rate_with_mixed_results():
+    llm = make_manager(fail_first=2)
+    for i in range(4):
+        generate_hint_tree(llm, f"Place {i}")
+    # the cached repeat is a request too, answered without a call
+    generate_hint_tree(llm, "Place 3")
+    stats = llm.metrics()["hint_tree"]
+    assert (stats["requests"], stats["calls"], stats["cache_hits"], stats["fallbacks"]) == (5, 2, 1, 2)
+    assert stats["fallback_rate"] == 0.4
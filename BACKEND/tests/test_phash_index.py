@@ -0,0 +1,124 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from phash_index import HASH_BITS, MIH_MAX_RADIUS, MultiIndexHash, PhashIndex
+
+
+def brute_force(hashes, query, radius):
+    distances = [bin(h ^ query).count("1") for h in hashes]
+    return {i: d for i, d in enumerate(distances) if d <= radius}
+
+
+def near(rng, value, flips):
+    for bit in rng.sample(range(HASH_BITS), flips):
+        value ^= 1 << bit
+    return value
+
+
+@pytest.mark.parametrize("radius", [0, 3, 4, 8, MIH_MAX_RADIUS, MIH_MAX_RADIUS + 5])
+def test_search_matches_brute_force(radius):
+    rng = random.Random(radius)
+    query = rng.getrandbits(HASH_BITS)
+    # random hashes are ~32 bits away, so plant some inside and just outside the radius
+    hashes = [rng.getrandbits(HASH_BITS) for _ in range(300)]
+    hashes += [near(rng, query, rng.randint(0, radius + 2)) for _ in range(100)]
+    index = MultiIndexHash()
+    for h in hashes:
+        index.add(h)
+
+    positions, distances = index.search(query, radius)
+    expected = brute_force(hashes, query, radius)
+    assert dict(zip(positions.tolist(), distances.tolist())) == expected
+    assert len(expected) > 0
+
+
+def test_search_sees_hashes_added_after_a_search():
+    index = MultiIndexHash()
+    index.add(0)
+    index.search(0, 2)
+    index.add(0b101)
+    positions, distances = index.search(0, 2)
+    assert sorted(zip(positions.tolist(), distances.tolist())) == [(0, 0), (1, 2)]
+    assert len(index) == 2
+    assert distances.dtype == np.int64
+
+
+class FakeQuery:
+    def __init__(self, table):
+        self.table = table
+        self.after = None
+
+    def select(self, columns):
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        self.slice = (start, end + 1)
+        return self
+
+    def gt(self, column, value):
+        self.after = value
+        return self
+
+    def execute(self):
+        time.sleep(0.05)
+        self.table.calls += 1
+        rows = [row for row in self.table.rows if self.after is None or row["id"] > self.after]
+        return SimpleNamespace(data=rows[slice(*getattr(self, "slice", (None, None)))])
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+def checkpoint(row_id, hash_value):
+    return {"id": row_id, "location_name": "Old Main", "image_hash": f"{hash_value:016x}", "image_path": None}
+
+
+def test_concurrent_refreshes_add_each_row_once():
+    supabase = FakeSupabase([checkpoint(1, 0)])
+    index = PhashIndex(supabase, refresh_interval=0)
+    index.load()
+    supabase.rows.append(checkpoint(2, 1))
+    # this worker's upload lands in the index while a refresh is about to fetch it again
+    index.add([checkpoint(2, 1)])
+    supabase.calls = 0
+
+    threads = [threading.Thread(target=index.identify, args=("0" * 16, 4)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert supabase.calls < 8
+    assert len(index.location_hashes("Old Main")) == 2
+    assert [c["distance"] for c in index.identify("0" * 16, 4)] == [0]
+
+
+def test_first_lookup_loads_right_after_boot(monkeypatch):
+    # monotonic starts near zero on a freshly booted host
+    monkeypatch.setattr(time, "monotonic", lambda: 30.0)
+    index = PhashIndex(FakeSupabase([checkpoint(1, 0)]))
+    assert [c["location_name"] for c in index.identify("0" * 16, 4)] == ["Old Main"]
+
+
+def test_add_before_the_first_load_keeps_existing_references():
+    supabase = FakeSupabase([checkpoint(1, 0), checkpoint(2, 1)])
+    index = PhashIndex(supabase)
+    # a worker whose first image request is /add_sample_image
+    supabase.rows.append(checkpoint(3, 3))
+    index.add([checkpoint(3, 3)])
+    assert len(index.location_hashes("Old Main")) == 3
+    assert index.match("Old Main", "0" * 16)[0].min() == 0
@@ -0,0 +1,86 @@
+from geo import geohash_cells_covering
+from place_cache import PlaceCache, SQLitePlaceStore
+from places_client import PlacesClient
+
+PLACE = {"place_id": "a", "name": "A", "user_ratings_total": 3,
+         "geometry": {"location": {"lat": 40.7800, "lng": -73.9500}}}
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        self.calls += 1
+        return FakeResponse(self.replies.pop(0))
+
+
+def make_client(tmp_path, replies):
+    client = PlacesClient("key", max_concurrency=1, retries=0,
+                          cache=PlaceCache(SQLitePlaceStore(str(tmp_path / "places.sqlite3"))))
+    client.session = FakeSession(replies)
+    return client
+
+
+def test_failed_search_reports_incomplete():
+    client = PlacesClient("key", max_concurrency=1, retries=0)
+    client.session = FakeSession([{"status": "REQUEST_DENIED", "results": []}])
+    assert client.nearby_places("museum", 20, 40.78, -73.95, 500) == ([], False)
+
+
+def search(client, keywords=("museum",), lat=40.78, lon=-73.95, radius=1):
+    return client.nearby_places_multi_keyword(list(keywords), 20, lat, lon, radius)
+
+
+def test_outage_is_not_cached(tmp_path):
+    client = make_client(tmp_path, [{"status": "REQUEST_DENIED", "results": []}])
+    assert search(client) == []
+
+    # google is back, the next call has to reach it instead of replaying the outage
+    client.session = FakeSession([{"status": "OK", "results": [PLACE]}])
+    assert search(client) == [PLACE]
+    client.session = FakeSession([])
+    assert search(client) == [PLACE]
+    assert client.session.calls == 0
+
+
+def test_zero_results_is_cached(tmp_path):
+    client = make_client(tmp_path, [{"status": "ZERO_RESULTS", "results": []}])
+    assert search(client) == []
+    client.session = FakeSession([])
+    assert search(client) == []
+    assert client.session.calls == 0
+
+
+def test_cold_cache_is_one_search_per_keyword(tmp_path):
+    assert len(geohash_cells_covering(40.78, -73.95, 1.609)) > 1
+    client = make_client(tmp_path, [{"status": "OK", "results": [PLACE]}] * 2)
+    assert search(client, ["museum", "park"]) == [PLACE]
+    assert client.session.calls == 2
+
+
+def test_cells_are_reused_only_inside_the_searched_circle(tmp_path):
+    client = make_client(tmp_path, [{"status": "OK", "results": [PLACE]}])
+    search(client)
+
+    # a smaller circle inside the first one (same cell size) is answered from the cells
+    client.session = FakeSession([])
+    assert search(client, lat=40.781, radius=0.8) == [PLACE]
+    assert client.session.calls == 0
+
+    # a circle reaching past it would miss whatever the first search never looked at
+    other = dict(PLACE, place_id="b", geometry={"location": {"lat": 40.7950, "lng": -73.9500}})
+    client.session = FakeSession([{"status": "OK", "results": [PLACE, other]}])
+    assert search(client, lat=40.79) == [PLACE, other]
+    assert client.session.calls == 1
@@ -0,0 +1,44 @@
+from flask import Flask, request
+
+from responses import ResponseCompressor, json_response
+
+ROUTES = {"routes": [{"Cluster Name": "Museum Mile", "Route": [{"Name": f"stop {i}"} for i in range(100)]}]}
+
+
+def make_client():
+    app = Flask(__name__)
+    compressor = ResponseCompressor()
+
+    @app.route("/lookup", methods=["GET", "POST"])
+    def lookup():
+        return json_response(ROUTES, etag=True)
+
+    @app.after_request
+    def compress(response):
+        return compressor(response, request)
+
+    return app.test_client()
+
+
+def test_post_lookup_answers_304_for_its_etag():
+    client = make_client()
+    for encoding in ("", "gzip"):
+        first = client.post("/lookup", json={}, headers={"Accept-Encoding": encoding})
+        etag = first.headers["ETag"]
+        again = client.post("/lookup", json={}, headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.headers["ETag"] == etag
+        assert again.data == b""
+
+
+def test_post_lookup_with_another_etag_gets_the_body():
+    client = make_client()
+    response = client.post("/lookup", json={}, headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.get_json() == ROUTES
+
+
+def test_get_still_goes_through_werkzeug():
+    client = make_client()
+    etag = client.get("/lookup").headers["ETag"]
+    assert client.get("/lookup", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,39 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from route_engine import kmeans_pp
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_co_located_venues_keep_distinct_sites_apart(seed):
+    sites = np.array([[0.0, 0.0], [5.0, 0.0], [0.0, 5.0]])
+    points = sites[np.arange(20) % 3]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        labels = kmeans_pp(points, 5, np.random.default_rng(seed))
+
+    # one cluster per site, every venue of a site in the same cluster
+    assert len(set(labels)) == 3
+    for site in range(3):
+        assert len(set(labels[np.arange(20) % 3 == site])) == 1
+
+
+def test_separated_groups_are_found():
+    rng = np.random.default_rng(1)
+    centers = np.array([[0.0, 0.0], [10.0, 10.0], [-10.0, 10.0]])
+    points = np.vstack([center + rng.normal(0, 0.3, (15, 2)) for center in centers])
+
+    labels = kmeans_pp(points, 3, np.random.default_rng(0))
+
+    assert sorted(np.bincount(labels)) == [15, 15, 15]
+    for group in range(3):
+        assert len(set(labels[group * 15:(group + 1) * 15])) == 1
+
+
+def test_more_clusters_than_points_never_leaves_one_empty():
+    points = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [4.0, 4.0]])
+    labels = kmeans_pp(points, 10, np.random.default_rng(3))
+    assert sorted(labels) == [0, 1, 2, 3]
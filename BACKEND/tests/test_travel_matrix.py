@@ -0,0 +1,87 @@
+import threading
+import time
+
+from travel_matrix import TravelMatrix
+
+
+class FakeResponse:
+    def __init__(self, elements):
+        self.elements = elements
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.elements
+
+
+class FakeSession:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.elements = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls += 1
+            self.elements += len(json["origins"]) * len(json["destinations"])
+        return FakeResponse([{"originIndex": i, "destinationIndex": j, "condition": "ROUTE_EXISTS",
+                              "duration": "600s", "distanceMeters": 5000}
+                             for i in range(len(json["origins"])) for j in range(len(json["destinations"]))])
+
+
+def chain(start, stops):
+    return [(40.70 + start + i * 0.01, -73.90) for i in range(stops + 1)]
+
+
+def consecutive(path):
+    return list(zip(path[:-1], path[1:]))
+
+
+def test_each_route_is_one_matrix_call():
+    matrix = TravelMatrix("key")
+    matrix.session = FakeSession()
+    paths = [chain(cluster, 5) for cluster in range(5)]
+
+    legs = matrix.route_legs(paths, ["driving"])["driving"]
+
+    # 5 origins x 5 destinations per route instead of one call per leg
+    assert matrix.session.calls == 5
+    assert matrix.session.elements == 125
+    pairs = [pair for path in paths for pair in consecutive(path)]
+    assert all(legs[pair] == {"minutes": 10.0, "km": 5.0} for pair in pairs)
+
+
+def test_long_routes_split_within_the_element_limit():
+    matrix = TravelMatrix("key")
+    matrix.session = FakeSession()
+    # transit allows 100 elements, so 15 legs are a 10x10 and a 5x5 call
+    matrix.route_legs([chain(0, 15)], ["transit"])
+    assert matrix.session.calls == 2
+    assert matrix.session.elements == 125
+
+
+def test_everything_fetched_is_cached():
+    matrix = TravelMatrix("key")
+    matrix.session = FakeSession()
+    path = chain(0, 4)
+    matrix.route_legs([path], ["walking"])
+    # the same stops in another order were in the first call's matrix
+    reordered = [path[0], path[2], path[1], path[3], path[4]]
+    legs = matrix.route_legs([path, reordered], ["walking"])["walking"]
+
+    assert matrix.session.calls == 1
+    assert all("estimated" not in legs[pair] for pair in consecutive(reordered))
+
+
+def test_modes_share_one_budget():
+    matrix = TravelMatrix("key", budget=1)
+    matrix.session = FakeSession(delay=0.4)
+    started = time.monotonic()
+
+    legs = matrix.route_legs([chain(0, 3)], ["driving", "walking", "biking", "transit"])
+
+    assert time.monotonic() - started < 1
+    assert all("estimated" not in leg for mode in legs.values() for leg in mode.values())
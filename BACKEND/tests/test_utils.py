@@ -0,0 +1,26 @@
+from utils import parameter_fingerprint
+
+BASE = {"address": "164 East 87th Street, New York", "keyword": ["museum", "park"], "radius": 10,
+        "modes": ["driving"], "time_limit": 120, "time_per_location": 30}
+
+
+def test_fingerprint_ignores_order_case_and_punctuation():
+    same = dict(BASE, address="164  east 87th street. new york", keyword=[" Park", "MUSEUM", "park"])
+    assert parameter_fingerprint(same) == parameter_fingerprint(BASE)
+
+
+def test_fingerprint_shares_a_bucket():
+    assert parameter_fingerprint(dict(BASE, radius=10.6, time_limit=134)) == parameter_fingerprint(BASE)
+    assert parameter_fingerprint(dict(BASE, time_limit=135)) != parameter_fingerprint(BASE)
+
+
+def test_fingerprint_changes_with_the_request():
+    for change in ({"keyword": ["museum"]}, {"modes": ["walking"]}, {"time_per_location": 15},
+                   {"accessibility": True}, {"address": "165 East 87th Street, New York"}):
+        assert parameter_fingerprint(dict(BASE, **change)) != parameter_fingerprint(BASE)
+
+
+def test_fingerprint_time_per_location_is_numeric():
+    for same in (30.0, "30", 30.4):
+        assert parameter_fingerprint(dict(BASE, time_per_location=same)) == parameter_fingerprint(BASE)
+    assert parameter_fingerprint(dict(BASE, time_per_location=None)) == parameter_fingerprint(dict(BASE, time_per_location=0))
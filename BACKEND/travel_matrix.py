@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import requests
+
+from geo import haversine_km
+
+ROUTE_MATRIX_URL = "https://routes.googleapis.com/distanceMatrix/v2:computeRouteMatrix"
+ROUTE_MATRIX_FIELDS = "originIndex,destinationIndex,duration,distanceMeters,condition"
+LEG_KIND = "leg"
+ROUND_DIGITS = 3
+TIME_BUCKET_HOURS = 3
+# routes api allows 625 elements per call, transit only 100, so a route gets one call for up to
+# this many legs
+MAX_BLOCK = {"TRANSIT": 10}
+DEFAULT_BLOCK = 25
+
+TRAVEL_MODES = {
+    "driving": "DRIVE",
+    "walking": "WALK",
+    "biking": "BICYCLE",
+    "bicycling": "BICYCLE",
+    "bus": "TRANSIT",
+    "train": "TRANSIT",
+    "transit": "TRANSIT",
+}
+
+# rough door-to-door speeds (km/h) and detour factors for when we can't wait on google
+ESTIMATE_SPEED_KMH = {"DRIVE": 35, "WALK": 4.8, "BICYCLE": 14, "TRANSIT": 20}
+ESTIMATE_DETOUR = {"DRIVE": 1.35, "WALK": 1.25, "BICYCLE": 1.3, "TRANSIT": 1.4}
+
+
+def rounded_point(point):
+    return round(point[0], ROUND_DIGITS), round(point[1], ROUND_DIGITS)
+
+
+def estimate_leg(origin, destination, mode):
+    travel_mode = TRAVEL_MODES.get(mode, "DRIVE")
+    km = haversine_km(origin[0], origin[1], destination[0], destination[1]) * ESTIMATE_DETOUR[travel_mode]
+    return {"minutes": round(km / ESTIMATE_SPEED_KMH[travel_mode] * 60, 1), "km": round(km, 1), "estimated": True}
+
+
+class TravelMatrix:
+    # per-leg travel time/distance cache, missing legs for one request are filled together
+
+    def __init__(self, api_key, store=None, ttl=7 * 24 * 3600, budget=8, timeout=15, max_entries=50000):
+        self.api_key = api_key
+        self.store = store
+        self.ttl = ttl
+        self.budget = budget
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.session = requests.Session()
+        # one fill per travel mode, every mode of a request runs at once
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="matrix")
+        # the calls of one fill run side by side, separate pool so fills can't starve each other
+        self.fetch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="matrix-fetch")
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def leg_key(self, origin, destination, mode, when=None):
+        when = when or datetime.now()
+        (olat, olng), (dlat, dlng) = rounded_point(origin), rounded_point(destination)
+        return f"{mode}|{when.hour // TIME_BUCKET_HOURS}|{olat},{olng}|{dlat},{dlng}"
+
+    def route_legs(self, paths, modes):
+        # paths are [start, stop, stop, ...] point lists, one per route, returns {mode: {(origin, destination): leg}}
+        # for every consecutive pair, with all modes fetched side by side under one budget
+        lookups = {}
+        futures = {}
+        for mode in dict.fromkeys(modes):
+            keys = {pair: self.leg_key(pair[0], pair[1], mode) for path in paths for pair in zip(path[:-1], path[1:])}
+            found = self._get_many(set(keys.values()))
+            lookups[mode] = keys, found
+            missing = [path for path in paths if any(keys[pair] not in found for pair in zip(path[:-1], path[1:]))]
+            if missing:
+                futures[mode] = self.executor.submit(self._fill, missing, mode, keys)
+
+        done, _ = wait(futures.values(), timeout=self.budget)
+        for mode, future in futures.items():
+            keys, found = lookups[mode]
+            if future not in done:
+                # google is slow, estimate now and let the fetch finish warming the cache
+                print(f"Route matrix over budget, estimating {mode} legs")
+                continue
+            try:
+                found.update(future.result())
+            except Exception as e:
+                print(f"Route matrix failed, estimating {mode} legs: {str(e)}")
+
+        return {mode: {pair: found.get(key) or estimate_leg(pair[0], pair[1], mode) for pair, key in keys.items()}
+                for mode, (keys, found) in lookups.items()}
+
+    def _fill(self, paths, mode, keys):
+        # one origins x destinations call per route: every point but the last as an origin, every
+        # point after the start as a destination. The extra elements are other orders of the same
+        # stops and are cached along with the legs that were asked for
+        travel_mode = TRAVEL_MODES.get(mode, "DRIVE")
+        block = MAX_BLOCK.get(travel_mode, DEFAULT_BLOCK)
+        calls = []
+        for path in paths:
+            for i in range(0, len(path) - 1, block):
+                segment = path[i:i + block + 1]
+                calls.append((list(dict.fromkeys(segment[:-1])), list(dict.fromkeys(segment[1:]))))
+
+        fetched = {}
+        for legs in self.fetch_executor.map(lambda call: self._fetch(*call, travel_mode), calls):
+            fetched.update((keys.get(pair) or self.leg_key(pair[0], pair[1], mode), leg) for pair, leg in legs.items())
+        self._set_many(fetched)
+        return fetched
+
+    def _fetch(self, origins, destinations, travel_mode):
+        body = {
+            "origins": [self._waypoint(point) for point in origins],
+            "destinations": [self._waypoint(point) for point in destinations],
+            "travelMode": travel_mode,
+        }
+        if travel_mode == "DRIVE":
+            body["routingPreference"] = "TRAFFIC_AWARE"
+        headers = {"X-Goog-Api-Key": self.api_key, "X-Goog-FieldMask": ROUTE_MATRIX_FIELDS}
+        response = self.session.post(ROUTE_MATRIX_URL, json=body, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+
+        legs = {}
+        for element in response.json():
+            if element.get("condition") != "ROUTE_EXISTS":
+                continue
+            pair = (origins[element["originIndex"]], destinations[element["destinationIndex"]])
+            legs[pair] = {
+                "minutes": round(float(element.get("duration", "0s").rstrip("s")) / 60, 1),
+                "km": round(element.get("distanceMeters", 0) / 1000, 1),
+            }
+        return legs
+
+    def _waypoint(self, point):
+        return {"waypoint": {"location": {"latLng": {"latitude": point[0], "longitude": point[1]}}}}
+
+    def _get_many(self, keys):
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry and entry[1] > now:
+                    self._memory.move_to_end(key)
+                    found[key] = entry[0]
+        remaining = [key for key in keys if key not in found]
+        if remaining and self.store is not None:
+            try:
+                stored = self.store.get_many(LEG_KIND, remaining, self.ttl)
+            except Exception as e:
+                print(f"Leg cache read failed: {str(e)}")
+                stored = {}
+            self._remember(stored)
+            found.update(stored)
+        return found
+
+    def _set_many(self, legs):
+        self._remember(legs)
+        if legs and self.store is not None:
+            try:
+                self.store.set_many(LEG_KIND, legs)
+            except Exception as e:
+                print(f"Leg cache write failed: {str(e)}")
+
+    def _remember(self, legs):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._memory.update((key, (leg, expires_at)) for key, leg in legs.items())
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
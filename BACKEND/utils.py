@@ -1,28 +1,86 @@
-def query_database(inputs_collection, parameters):
-    query = {
-        "address": parameters["address"],
-        "radius": parameters["radius"],
-        "accessibility": parameters["accessibility"],
-        "use_current_location": parameters["use_current_location"],
-        "time_per_location": parameters["time_per_location"],
-        "time_limit": parameters["time_limit"]
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+# same defaults /optimize_route uses, so stored inputs line up with what was actually computed
+ROUTE_PARAMETER_DEFAULTS = {
+    "address": None,
+    "keyword": [],
+    "radius": 10,
+    "accessibility": False,
+    "modes": ["driving"],
+    "use_current_location": False,
+    "time_per_location": 0,
+    "time_limit": 500,
+}
+
+
+def route_parameters(data):
+    return {key: data.get(key, default) for key, default in ROUTE_PARAMETER_DEFAULTS.items()}
+
+
+# requests that differ by less than a bucket share one stored result
+RADIUS_BUCKET = 1
+TIME_LIMIT_BUCKET = 15
+
+
+def normalize_address(address):
+    if not address:
+        return ""
+    address = re.sub(r'[.,]+', ' ', address.lower())
+    return " ".join(address.split())
+
+
+def _bucket(value, size):
+    if value is None:
+        return None
+    return int(float(value) // size)
+
+
+def _normalized_set(values):
+    return sorted({str(v).strip().lower() for v in (values or []) if str(v).strip()})
+
+
+def parameter_fingerprint(parameters):
+    canonical = {
+        "address": normalize_address(parameters.get("address")),
+        "keywords": _normalized_set(parameters.get("keyword")),
+        "modes": _normalized_set(parameters.get("modes")),
+        "radius": _bucket(parameters.get("radius"), RADIUS_BUCKET),
+        "time_limit": _bucket(parameters.get("time_limit"), TIME_LIMIT_BUCKET),
+        "time_per_location": _bucket(parameters.get("time_per_location") or 0, 1),
+        "accessibility": bool(parameters.get("accessibility")),
+        "use_current_location": bool(parameters.get("use_current_location")),
     }
-    
-    # arrays need special handling or mongo gets confused
-    if parameters.get("keyword") and len(parameters["keyword"]) > 0:
-        query["keywords"] = {"$all": parameters["keyword"]}
-    else:
-        query["keywords"] = {"$in": [[], None]}
-    
-    if parameters.get("modes") and len(parameters["modes"]) > 0:
-        query["modes"] = {"$all": parameters["modes"]}
-    else:
-        query["modes"] = {"$in": [[], None]}
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def ensure_indexes(inputs_collection, outputs_collection):
+    try:
+        # partial so legacy docs that were never fingerprinted don't collide on null
+        inputs_collection.create_index(
+            "fingerprint", unique=True, partialFilterExpression={"fingerprint": {"$exists": True}})
+        outputs_collection.create_index("input_id")
+    except Exception as e:
+        print(f"Error creating indexes (run backfill_fingerprints.py first?): {str(e)}")
+
+
+def query_database(inputs_collection, parameters, max_age=None):
+    # single indexed point lookup instead of matching eight fields with $all
+    query = {"fingerprint": parameter_fingerprint(parameters)}
+
+    # only trust results computed recently, hand-seeded docs have no created_at so they never count as fresh
+    if max_age is not None:
+        query["created_at"] = {"$gte": datetime.utcnow() - timedelta(seconds=max_age)}
     
     print("Query sent to MongoDB:", query)
 
     try:
-        result = inputs_collection.find_one(query)
+        result = inputs_collection.find_one(query, projection={"_id": 1})
         
         if result:
             input_id = result["_id"]
@@ -36,46 +94,95 @@ def query_database(inputs_collection, parameters):
         print(f"Error querying database: {str(e)}")
         return None
 
+def save_route_results(inputs_collection, outputs_collection, parameters, routes):
+    # write-through so the next identical request is served straight from mongo
+    from pymongo import ReturnDocument
+
+    now = datetime.utcnow()
+    fingerprint = parameter_fingerprint(parameters)
+    input_doc = {
+        "address": parameters["address"],
+        "keywords": parameters.get("keyword") or [],
+        "radius": parameters["radius"],
+        "accessibility": parameters["accessibility"],
+        "modes": parameters.get("modes") or [],
+        "use_current_location": parameters["use_current_location"],
+        "time_per_location": parameters["time_per_location"],
+        "time_limit": parameters["time_limit"],
+        "fingerprint": fingerprint,
+        "created_at": now,
+    }
+
+    try:
+        input_id = inputs_collection.find_one_and_update(
+            {"fingerprint": fingerprint}, {"$set": input_doc},
+            upsert=True, projection={"_id": 1}, return_document=ReturnDocument.AFTER)["_id"]
+        outputs_collection.replace_one(
+            {"input_id": input_id}, {"input_id": input_id, "routes": routes, "created_at": now}, upsert=True)
+        print(f"Saved routes for input ID: {input_id}")
+        return input_id
+    except Exception as e:
+        print(f"Error saving routes to database: {str(e)}")
+        return None
+
+def find_page(collection, after=None, limit=None, projection=None):
+    # newest first, "after" is the last _id of the previous page
+    query = {}
+    if after:
+        query["_id"] = {"$lt": ObjectId(after)}
+    cursor = collection.find(query, projection).sort("_id", -1).batch_size(100)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+def stringify_ids(doc):
+    doc["_id"] = str(doc["_id"])
+    if "input_id" in doc:
+        doc["input_id"] = str(doc["input_id"])
+    return doc
+
+def route_shape():
+    # the nested output document in its final shape, built by mongo so nothing is copied in python
+    leg = {
+        "Destination": {"$ifNull": ["$$leg.Destination", ""]},
+        "Estimated Travel Distance (km)": {"$ifNull": ["$$leg.Estimated Travel Distance (km)", 0]},
+        "Estimated Travel Time (min)": {"$ifNull": ["$$leg.Estimated Travel Time (min)", 0]},
+        "Google Maps Link": {"$ifNull": ["$$leg.Google Maps Link", ""]},
+        "Image URL": {"$ifNull": ["$$leg.Image URL", None]},
+        "Mode of Transport": {"$ifNull": ["$$leg.Mode of Transport", ""]},
+        "Name": {"$ifNull": ["$$leg.Name", ""]},
+        "Mystery Name": {"$ifNull": ["$$leg.Mystery Name", "Mystery Place"]},  # fallback name
+        "Origin": {"$ifNull": ["$$leg.Origin", ""]},
+    }
+    route = {
+        "Cluster Description": {"$ifNull": ["$$route.Cluster Description", ""]},
+        "Cluster ID": {"$ifNull": ["$$route.Cluster ID", 0]},
+        "Cluster Name": {"$ifNull": ["$$route.Cluster Name", ""]},
+        "Estimated Travel Distance (km)": {"$ifNull": ["$$route.Estimated Travel Distance (km)", 0]},
+        "Estimated Travel Time (min)": {"$ifNull": ["$$route.Estimated Travel Time (min)", 0]},
+        "Ratings": {"$ifNull": ["$$route.Ratings", 0]},
+        "Popularity": {"$ifNull": ["$$route.Popularity", 0]},
+        "Route": {"$map": {"input": {"$ifNull": ["$$route.Route", []]}, "as": "leg", "in": leg}},
+    }
+    return {
+        "_id": {"$toString": "$_id"},
+        "input_id": {"$toString": {"$ifNull": ["$input_id", ""]}},
+        "routes": {"$map": {"input": {"$ifNull": ["$routes", []]}, "as": "route", "in": route}},
+    }
+
+
+def formatted_outputs_pipeline(query=None):
+    pipeline = [{"$match": query}] if query else []
+    return pipeline + [{"$project": route_shape()}]
+
+
 def get_database_outputs(outputs_collection, input_id):
     print("Fetching outputs for input ID:", input_id)
 
     try:
-        outputs_data = outputs_collection.find({"input_id": input_id})
-
-        formatted_outputs = []
-        # this nested structure is a pain to format
-        for output_doc in outputs_data:
-            formatted_doc = {
-                "_id": str(output_doc["_id"]),
-                "input_id": str(output_doc.get("input_id", "")),
-                "routes": [
-                    {
-                        "Cluster Description": route.get("Cluster Description", ""),
-                        "Cluster ID": route.get("Cluster ID", 0),
-                        "Cluster Name": route.get("Cluster Name", ""),
-                        "Estimated Travel Distance (km)": route.get("Estimated Travel Distance (km)", 0),
-                        "Estimated Travel Time (min)": route.get("Estimated Travel Time (min)", 0),
-                        "Ratings": route.get("Ratings", 0),
-                        "Popularity": route.get("Popularity", 0),
-                        "Route": [
-                            {
-                                "Destination": sub_route.get("Destination", ""),
-                                "Estimated Travel Distance (km)": sub_route.get("Estimated Travel Distance (km)", 0),
-                                "Estimated Travel Time (min)": sub_route.get("Estimated Travel Time (min)", 0),
-                                "Google Maps Link": sub_route.get("Google Maps Link", ""),
-                                "Image URL": sub_route.get("Image URL", None),
-                                "Mode of Transport": sub_route.get("Mode of Transport", ""),
-                                "Name": sub_route.get("Name", ""),
-                                "Mystery Name": sub_route.get("Mystery Name", "Mystery Place"),  # fallback name
-                                "Origin": sub_route.get("Origin", ""),
-                            }
-                            for sub_route in route.get("Route", [])
-                        ],
-                    }
-                    for route in output_doc.get("routes", [])
-                ],
-            }
-            formatted_outputs.append(formatted_doc)
+        # documents come off the cursor already formatted, the list is kept because callers index
+        # outputs[0] and treat an empty result as a miss
+        formatted_outputs = list(outputs_collection.aggregate(formatted_outputs_pipeline({"input_id": input_id})))
 
         if not formatted_outputs:
             print("No outputs found for the given input ID.")
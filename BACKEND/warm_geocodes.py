@@ -0,0 +1,35 @@
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from geocoding import Geocoder
+from place_cache import SQLitePlaceStore, MongoPlaceStore
+
+
+def open_place_store(db):
+    # same store the app reads from, see PLACE_CACHE_BACKEND in app.py
+    backend = os.getenv("PLACE_CACHE_BACKEND", "sqlite")
+    if backend == "sqlite":
+        return SQLitePlaceStore(os.getenv("PLACE_CACHE_PATH", "place_cache.sqlite3"))
+    if backend == "mongo":
+        return MongoPlaceStore(db['place_cache'])
+    return None
+
+
+if __name__ == "__main__":
+    # python warm_geocodes.py [addresses.txt], without a file every address ever requested is warmed
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGO_URL"))['routeOptimizer']
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            addresses = [line.strip() for line in f if line.strip()]
+    else:
+        addresses = db['inputs'].distinct("address", {"use_current_location": {"$ne": True}})
+
+    store = open_place_store(db)
+    if store is None:
+        sys.exit("PLACE_CACHE_BACKEND is none, there is nowhere to keep warmed geocodes")
+    geocoder = Geocoder(os.getenv("API_KEY"), store, ttl=int(os.getenv("GEOCODE_TTL", 90 * 24 * 3600)))
+    geocoder.warm(addresses)
@@ -9,6 +9,18 @@ import MapView, { Marker } from 'react-native-maps';
 
 // Get device screen width for animation calculations
 const SCREEN_WIDTH = Dimensions.get('window').width;
+const MAX_HINT_STEPS = 3;
+
+// Same walk as next_hint in the backend, so later hints need no network at all
+const nextHintFromTree = (tree, locationName, previousHintId, userResponse, rejectCount, acceptCount) => {
+  const finalHint = { hint: { id: 'final', text: `The answer is ${locationName}.`, type: 'factual' }, is_final: true };
+  if (previousHintId === 'final' || rejectCount >= MAX_HINT_STEPS || acceptCount >= MAX_HINT_STEPS) return finalHint;
+  if (previousHintId == null) return { hint: { id: '1', ...tree['1'] }, is_final: false };
+  const current = tree[previousHintId] || {};
+  const nextId = userResponse === 'understood' ? current.on_understood : current.on_confused;
+  if (nextId == null || !tree[nextId]) return finalHint;
+  return { hint: { id: nextId, ...tree[nextId] }, is_final: false };
+};
 
 const LocationQuizScreen = ({ route, navigation }) => {
   const { colors } = useTheme();
@@ -29,12 +41,16 @@ const LocationQuizScreen = ({ route, navigation }) => {
   const [rejectCount, setRejectCount] = useState(0);
   const [acceptCount, setAcceptCount] = useState(0);
   const [showAnswerAfterSwipes, setShowAnswerAfterSwipes] = useState(false);
+  // refs, not state, so a swipe always sees the tree the first hint brought back
+  const hintTree = useRef(null);
+  const treeToken = useRef(null);
 
   // Animation state
   const position = useRef(new Animated.ValueXY()).current;
   const SWIPE_THRESHOLD = 120;
 
-  // PanResponder for swipe gestures
+  // PanResponder for swipe gestures, created once so it goes through a ref to this render's handleSwipe
+  const handleSwipeRef = useRef(null);
   const panResponder = useRef(
     PanResponder.create({
       onMoveShouldSetPanResponder: () => true,
@@ -43,9 +59,9 @@ const LocationQuizScreen = ({ route, navigation }) => {
       }),
       onPanResponderRelease: (_, gesture) => {
         if (gesture.dx > SWIPE_THRESHOLD) {
-          handleSwipe(false); // Swipe right = confused
+          handleSwipeRef.current(false); // Swipe right = confused
         } else if (gesture.dx < -SWIPE_THRESHOLD) {
-          handleSwipe(true); // Swipe left = understood
+          handleSwipeRef.current(true); // Swipe left = understood
         } else {
           Animated.spring(position, {
             toValue: { x: 0, y: 0 },
@@ -68,15 +84,35 @@ const LocationQuizScreen = ({ route, navigation }) => {
     setLoadingHints(true);
 
     try {
-      const response = await axios.post('http://192.168.0.170:5000/generate_location_hint', {
-        location_name: destination.name,
-        previous_hint_id: currentHintId,
-        user_response: userResponse,
-        reject_count: updatedReject,
-        accept_count: updatedAccept,
-      });
+      let data;
+      if (hintTree.current) {
+        // the whole tree came with the first hint, walk it locally
+        try {
+          data = nextHintFromTree(hintTree.current, destination.name, currentHintId, userResponse, updatedReject, updatedAccept);
+        } catch (error) {
+          console.warn("Hint tree unusable, asking the backend:", error);
+          hintTree.current = null;
+        }
+      }
+      if (!data) {
+        // the token lets the backend walk the same tree without its store
+        const response = await axios.post('http://192.168.0.170:5000/generate_location_hint', {
+          location_name: destination.name,
+          previous_hint_id: currentHintId,
+          user_response: userResponse,
+          reject_count: updatedReject,
+          accept_count: updatedAccept,
+          include_tree: currentHintId == null,
+          tree_token: treeToken.current,
+        });
+        data = response.data;
+        if (data.tree) {
+          hintTree.current = data.tree;
+          treeToken.current = data.tree_token;
+        }
+      }
 
-      const { hint, is_final } = response.data;
+      const { hint, is_final } = data;
 
       // Force reveal answer after 3 accepts or 3 rejects
       if (updatedReject >= 3 || updatedAccept >= 3) {
@@ -163,6 +199,8 @@ const LocationQuizScreen = ({ route, navigation }) => {
     });
   };
 
+  handleSwipeRef.current = handleSwipe;
+
   // Handle answer selection
   const handleAnswerSelection = (option) => {
     if (option.isCorrect) {